@@ -0,0 +1,185 @@
+"""
+In-memory lookup index over the sap table.
+
+Built once per run from the database and used by the account matchers instead of
+sending one SQL query per candidate number. Only rebuilt when SAP data is reloaded.
+SqlAccountLookup answers the same lookups with SQL queries, for matching a few texts
+without building the whole index.
+"""
+import sys
+
+# Customer lookup, in primary key order
+CUSTOMER_LOOKUP_SQL = '''
+    SELECT document_number, reference, company_code_currency_value,
+           company_code_currency_key, name, customer
+    FROM sap
+    WHERE customer = ?
+    ORDER BY document_number
+'''
+
+# Invoice lookup: each branch of the UNION can use its own index, ORDER BY rowid
+# keeps the records in the same order as a full table scan
+INVOICE_LOOKUP_SQL = '''
+    SELECT document_number, reference, company_code_currency_value,
+           company_code_currency_key, name, customer
+    FROM sap
+    WHERE rowid IN (
+        SELECT rowid FROM sap WHERE document_number = ?
+        UNION
+        SELECT rowid FROM sap WHERE reference = ?
+    )
+    ORDER BY rowid
+'''
+
+
+class AccountIndex:
+    """
+    Hash map index over the sap table:
+    - customer -> SAP records, in the order of a customer lookup (primary key order)
+    - document_number/reference -> SAP records, in the order of the invoice lookup
+    Records are (document_number, reference, company_code_currency_value,
+    company_code_currency_key, name, customer) tuples shared by both maps.
+    """
+
+    def __init__(self, customers=None, invoices=None):
+        self.customers = customers if customers is not None else {}
+        self.invoices = invoices if invoices is not None else {}
+        self._memory_usage = None
+
+    @classmethod
+    def from_connection(cls, conn):
+        """Build the index from the sap table of an open connection"""
+        cursor = conn.cursor()
+        customers = {}
+        invoice_entries = {}
+
+        # Primary key order, which is the order customer lookups return records in
+        cursor.execute('''
+            SELECT rowid, document_number, reference, company_code_currency_value,
+                   company_code_currency_key, name, customer
+            FROM sap ORDER BY customer, document_number
+        ''')
+        for row in cursor:
+            rowid, record = row[0], row[1:]
+            document_number, reference, customer = record[0], record[1], record[5]
+
+            customers.setdefault(customer, []).append(record)
+
+            if document_number is not None:
+                invoice_entries.setdefault(document_number, []).append((rowid, record))
+            if reference is not None and reference != document_number:
+                invoice_entries.setdefault(reference, []).append((rowid, record))
+
+        # Invoice lookups return records in table (rowid) order
+        invoices = {}
+        for number, entries in invoice_entries.items():
+            entries.sort(key=lambda entry: entry[0])
+            invoices[number] = [record for _, record in entries]
+
+        return cls(customers, invoices)
+
+    def find_customer(self, number):
+        """SAP records for a customer number (empty list if unknown)"""
+        return self.customers.get(number, [])
+
+    def find_invoice(self, number):
+        """SAP records whose document_number or reference equals number (empty list if unknown)"""
+        return self.invoices.get(number, [])
+
+    def memory_usage(self):
+        """
+        Approximate memory held by the index in bytes (maps, lists, records and values).
+        Walks every object of the index, which takes about as long as building it.
+        """
+        if self._memory_usage is None:
+            seen = set()
+            total = 0
+
+            def add(obj):
+                nonlocal total
+                if id(obj) not in seen:
+                    seen.add(id(obj))
+                    total += sys.getsizeof(obj)
+
+            for mapping in (self.customers, self.invoices):
+                add(mapping)
+                for key, records in mapping.items():
+                    add(key)
+                    add(records)
+                    for record in records:
+                        if id(record) not in seen:
+                            add(record)
+                            for value in record:
+                                add(value)
+
+            self._memory_usage = total
+        return self._memory_usage
+
+    def __len__(self):
+        return sum(len(records) for records in self.customers.values())
+
+    def __repr__(self):
+        return (f"AccountIndex({len(self)} records, {len(self.customers)} customers, "
+                f"{len(self.invoices)} invoice keys)")
+
+
+class SqlAccountLookup:
+    """
+    The lookups of an AccountIndex as SQL queries on an open connection, with the same
+    results and record order. Customer lookups use the sap primary key, invoice lookups
+    the document_number and reference indexes.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def find_customer(self, number):
+        """SAP records for a customer number (empty list if unknown)"""
+        return self.conn.execute(CUSTOMER_LOOKUP_SQL, (number,)).fetchall()
+
+    def find_invoice(self, number):
+        """SAP records whose document_number or reference equals number (empty list if unknown)"""
+        return self.conn.execute(INVOICE_LOOKUP_SQL, (number, number)).fetchall()
+
+
+_cached_index = None
+_cached_key = None
+
+
+def _database_key(conn):
+    """Identify the database file behind a connection (in-memory databases by connection)"""
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA database_list")
+    for _, name, path in cursor.fetchall():
+        if name == 'main':
+            return path or id(conn)
+    return id(conn)
+
+
+def get_account_index(conn, sap_generation=None):
+    """
+    Return the account index for this database, building it on first use.
+    Passing the SAP data generation also rebuilds it when another process reloaded SAP data.
+    """
+    global _cached_index, _cached_key
+
+    key = (_database_key(conn), sap_generation)
+    if _cached_index is None or _cached_key != key:
+        _cached_index = AccountIndex.from_connection(conn)
+        _cached_key = key
+        print(f"Built {_cached_index!r}")
+    return _cached_index
+
+
+def cached_account_index(conn, sap_generation=None):
+    """The account index of this database if it is already built (and current), else None"""
+    if _cached_index is not None and _cached_key == (_database_key(conn), sap_generation):
+        return _cached_index
+    return None
+
+
+def invalidate_account_index():
+    """Drop the cached index so it is rebuilt after SAP data has been reloaded"""
+    global _cached_index, _cached_key
+    _cached_index = None
+    _cached_key = None
@@ -0,0 +1,169 @@
+"""
+Account number recognition shared by the ticket matcher (create_database.py) and
+the email scraper (selenium_debug_session.py).
+
+A single precompiled regex tokenizes a description or email body in one pass into
+typed candidates; find_matches resolves them against an AccountIndex:
+- 10 digits starting with 00: drop 00, look up 8 digits in customer
+- 8 digits: look up directly in customer
+- 10 digits NOT starting with 00: look up in document_number or reference
+- XXX-XXXXX format: combine digits and try as 8-digit customer lookup
+- XX-XXXXXX format: combine digits and try as 8-digit customer lookup
+- Valid range check: if account is in valid ranges, accept even if not in SAP
+"""
+import re
+from bisect import bisect_right
+from collections import namedtuple
+
+# Valid account ranges (inclusive): accounts in these ranges are accepted even if not in SAP
+VALID_ACCOUNT_RANGES = [
+    (20600000, 20699999),
+    (25300000, 25399999),
+    (20300000, 24999999),
+    (25900000, 25999999),
+]
+
+# Account name used for valid-range accounts that are not in SAP
+VALID_ACCOUNT_NAME = 'VALID ACCOUNT (NOT IN SAP)'
+
+# Candidate kinds
+DASH_3_5 = 'dash_3_5'        # "239-63450"
+DASH_2_6 = 'dash_2_6'        # "20-572883"
+CUSTOMER = 'customer'        # "20572883"
+CUSTOMER_00 = 'customer_00'  # "0020572883"
+INVOICE = 'invoice'          # "1234567890"
+
+# Dash formats are tried first (3-5 before 2-6), then plain numbers in text order
+CANDIDATE_PRIORITY = {DASH_3_5: 0, DASH_2_6: 1, CUSTOMER: 2, CUSTOMER_00: 2, INVOICE: 2}
+
+# One pass over the text: XXX-XXXXX | XX-XXXXXX | 8-10 digits
+ACCOUNT_NUMBER_PATTERN = re.compile(r'\b(?:(\d{3})-(\d{5})|(\d{2})-(\d{6})|(\d{8,10}))\b')
+
+Candidate = namedtuple('Candidate', ['kind', 'number', 'raw', 'start'])
+
+
+class AccountRanges:
+    """Sorted, merged interval table for valid account ranges"""
+
+    def __init__(self, ranges):
+        merged = []
+        for low, high in sorted(ranges):
+            if merged and low <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], high)
+            else:
+                merged.append([low, high])
+        self.lows = [low for low, _ in merged]
+        self.highs = [high for _, high in merged]
+
+    def __contains__(self, account_number):
+        try:
+            num = int(account_number)
+        except (ValueError, TypeError):
+            return False
+        position = bisect_right(self.lows, num) - 1
+        return position >= 0 and num <= self.highs[position]
+
+    def __iter__(self):
+        return iter(zip(self.lows, self.highs))
+
+
+_valid_ranges = AccountRanges(VALID_ACCOUNT_RANGES)
+
+
+def configure_valid_account_ranges(ranges):
+    """Replace the default valid account ranges with a list of inclusive (low, high) pairs"""
+    global _valid_ranges
+    _valid_ranges = AccountRanges(ranges)
+
+
+def get_valid_account_ranges():
+    """Current default valid account ranges as a list of (low, high) pairs"""
+    return list(_valid_ranges)
+
+
+def is_valid_account_range(account_number, ranges=None):
+    """Check if account number is in one of the valid ranges (default: VALID_ACCOUNT_RANGES)"""
+    return account_number in (ranges if ranges is not None else _valid_ranges)
+
+
+def tokenize(text):
+    """Return the typed account number candidates found in text, in text order"""
+    candidates = []
+    if not text:
+        return candidates
+
+    for match in ACCOUNT_NUMBER_PATTERN.finditer(text):
+        if match.group(1) is not None:
+            candidates.append(Candidate(DASH_3_5, match.group(1) + match.group(2), match.group(0), match.start()))
+        elif match.group(3) is not None:
+            candidates.append(Candidate(DASH_2_6, match.group(3) + match.group(4), match.group(0), match.start()))
+        else:
+            number = match.group(5)
+            if len(number) == 8:
+                candidates.append(Candidate(CUSTOMER, number, number, match.start()))
+            elif len(number) == 10 and number.startswith('00'):
+                candidates.append(Candidate(CUSTOMER_00, number[2:], number, match.start()))
+            elif len(number) == 10:
+                candidates.append(Candidate(INVOICE, number, number, match.start()))
+
+    return candidates
+
+
+def resolve_candidate(candidate, index, ranges=None):
+    """
+    Resolve one candidate against the index.
+    Returns a list of (number, match_type, sap_record) tuples (empty if no match).
+    """
+    number = candidate.number
+
+    if candidate.kind == INVOICE:
+        return [(number, 'invoice', record) for record in index.find_invoice(number)]
+
+    match_type = 'customer_dash' if candidate.kind in (DASH_3_5, DASH_2_6) else 'customer'
+    results = index.find_customer(number)
+    if results:
+        return [(number, match_type, record) for record in results]
+    if is_valid_account_range(number, ranges):
+        # Valid range but not in SAP - create fake record
+        fake_record = ('', '', 0, '', VALID_ACCOUNT_NAME, number)
+        return [(number, match_type + '_valid', fake_record)]
+    return []
+
+
+def find_matches(text, index, ranges=None):
+    """
+    Find all account matches in text, in priority order: XXX-XXXXX formats, then
+    XX-XXXXXX formats, then plain numbers in text order.
+    Returns a list of (number, match_type, sap_record) tuples.
+    """
+    candidates = sorted(tokenize(text), key=lambda candidate: CANDIDATE_PRIORITY[candidate.kind])
+    matches = []
+    for candidate in candidates:
+        matches.extend(resolve_candidate(candidate, index, ranges))
+    return matches
+
+
+def find_first_match(text, index, ranges=None):
+    """Return the first match find_matches would return, or None, without resolving the rest"""
+    candidates = sorted(tokenize(text), key=lambda candidate: CANDIDATE_PRIORITY[candidate.kind])
+    for candidate in candidates:
+        matches = resolve_candidate(candidate, index, ranges)
+        if matches:
+            return matches[0]
+    return None
+
+
+def account_from_match(match):
+    """Account number and name to assign for a (number, match_type, sap_record) match"""
+    number, _, sap_record = match
+    account_number = sap_record[5] if sap_record[5] else number  # customer field
+    account_name = sap_record[4] if sap_record[4] else ''  # name field
+    return account_number, account_name
+
+
+def find_first_account(text, index, ranges=None):
+    """(account_number, account_name, match_type) of the first match in text, or None"""
+    match = find_first_match(text, index, ranges)
+    if match is None:
+        return None
+    return account_from_match(match) + (match[1],)
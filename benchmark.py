@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the data pipeline: SAP load, ServiceNow load, account index build,
+single-description matching, full ticket matching and export, each timed with the
+process's peak memory so far (and optionally the stage's own Python allocation peak).
+
+Runs on a fresh database with generated data (generate_test_data.py) or given exports,
+and appends one JSON line per run to a results file so versions can be compared:
+
+    python benchmark.py --sap-rows 1000000 --tickets 100000 --label before
+    python benchmark.py --sap-rows 1000000 --tickets 100000 --label after
+    python benchmark.py --compare
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Results file the runs are appended to (one JSON line per run)
+DEFAULT_RESULTS_FILE = 'benchmark_results.jsonl'
+
+# Descriptions matched one by one in the find_account_matches stage
+MATCH_SAMPLE_SIZE = 10000
+
+STAGES = ['create_database', 'load_sap_data', 'load_snow_data', 'build_account_index',
+          'find_account_matches', 'process_all_tickets', 'export']
+
+
+def windows_peak_working_set():
+    """Peak working set of this process in bytes, from GetProcessMemoryInfo (Windows only)"""
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    kernel32 = ctypes.WinDLL('kernel32')
+    psapi = ctypes.WinDLL('psapi')
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+    psapi.GetProcessMemoryInfo.restype = wintypes.BOOL
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        raise ctypes.WinError()
+    return counters.PeakWorkingSetSize
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory (working set on Windows) of this process since it started, in MB,
+    or None where it cannot be read. It never goes down, so after a stage it is the highest
+    peak of that stage and all stages before it.
+    """
+    if sys.platform == 'win32':
+        try:
+            return round(windows_peak_working_set() / (1024 * 1024), 1)
+        except OSError:
+            return None
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def git_commit():
+    """Current git commit of the working tree, if it is a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class StageTimer:
+    """
+    Times pipeline stages and records the process peak memory after each (process_peak_rss_mb)
+    and, with trace_memory, the stage's own Python allocation peak (python_peak_mb)
+    """
+
+    def __init__(self, trace_memory=False):
+        # Without a process peak the Python allocation peak is the only memory figure
+        if not trace_memory and peak_rss_mb() is None:
+            print("Process peak memory is not available here, recording the Python allocation peak instead")
+            trace_memory = True
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    def run(self, name, function, *args, rows=None, **kwargs):
+        """Run function as stage name and return its result"""
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+
+        stage = {'seconds': round(seconds, 3), 'process_peak_rss_mb': peak_rss_mb()}
+        if self.trace_memory:
+            stage['python_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            tracemalloc.stop()
+        if rows is not None:
+            stage['rows'] = rows if not callable(rows) else rows(result)
+            stage['rows_per_second'] = round(stage['rows'] / seconds) if seconds > 0 else None
+        self.stages[name] = stage
+
+        print(f"{name}: {seconds:.2f}s" + (f", {stage['rows']} rows" if rows is not None else "")
+              + (f", process peak RSS so far {stage['process_peak_rss_mb']} MB"
+                 if stage['process_peak_rss_mb'] is not None else "")
+              + (f", stage Python peak {stage['python_peak_mb']} MB" if self.trace_memory else ""))
+        return result
+
+
+def match_sample(conn, descriptions):
+    """Match each description on its own, as the GUI and scraper do"""
+    from create_database import find_account_matches
+
+    matched = 0
+    for description in descriptions:
+        if find_account_matches(description, conn):
+            matched += 1
+    return matched
+
+
+def run_benchmark(sap_file, snow_file, work_dir, engine='python', reader='csv', parallel=False,
+                  workers=None, trace_memory=False):
+    """Run all stages on a fresh database in work_dir. Returns the stage results and match count."""
+    db_path = os.path.join(work_dir, 'benchmark.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    from account_index import get_account_index
+    from create_database import (create_database, load_sap_data, load_snow_data, process_all_tickets,
+                                 get_sap_generation)
+    from db_connection import close_connection
+    from report_export import export_tickets
+
+    timer = StageTimer(trace_memory)
+    conn = timer.run('create_database', create_database, db_path)
+    timer.run('load_sap_data', load_sap_data, conn, sap_file, reader=reader, rows=lambda loaded: loaded)
+    timer.run('load_snow_data', load_snow_data, conn, snow_file, reader=reader, rows=lambda counts: counts[0])
+
+    # Built once per SAP generation and shared by the matching stages
+    index = timer.run('build_account_index', get_account_index, conn, get_sap_generation(conn))
+    # Measured outside the stage timing: walking the index takes about as long as building it
+    timer.stages['build_account_index']['index_mb'] = round(index.memory_usage() / (1024 * 1024), 1)
+    print(f"Account index holds about {timer.stages['build_account_index']['index_mb']} MB")
+
+    descriptions = [row[0] for row in conn.execute(
+        "SELECT short_description FROM snow ORDER BY ticket LIMIT ?", (MATCH_SAMPLE_SIZE,))]
+    timer.run('find_account_matches', match_sample, conn, descriptions, rows=len(descriptions))
+
+    matched = timer.run('process_all_tickets', process_all_tickets, conn, force_full=True,
+                        parallel=parallel, workers=workers, engine=engine,
+                        rows=conn.execute("SELECT COUNT(*) FROM snow").fetchone()[0])
+    timer.run('export', export_tickets, snow_file, os.path.join(work_dir, 'export.csv'),
+              db_path=db_path, rows=lambda exported: exported)
+    close_connection(db_path)
+    return timer.stages, matched
+
+
+def load_results(results_file):
+    if not os.path.exists(results_file):
+        return []
+    with open(results_file, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare_results(results_file, labels=None):
+    """Print the stage timings of runs side by side (the given labels, or the last two runs)"""
+    runs = load_results(results_file)
+    if labels:
+        by_label = {run.get('label'): run for run in runs}
+        missing = [label for label in labels if label not in by_label]
+        if missing:
+            raise SystemExit(f"No runs labelled {', '.join(missing)} in {results_file}")
+        runs = [by_label[label] for label in labels]
+    else:
+        runs = runs[-2:]
+    if not runs:
+        raise SystemExit(f"No benchmark results in {results_file}")
+
+    names = [run.get('label') or run['commit'] or run['timestamp'] for run in runs]
+    print(f"{'stage':<22}" + ''.join(f"{name:>16}" for name in names) + ("      change" if len(runs) > 1 else ""))
+    for stage in STAGES:
+        times = [run['stages'].get(stage, {}).get('seconds') for run in runs]
+        line = f"{stage:<22}" + ''.join(f"{t:>15.2f}s" if t is not None else f"{'-':>16}" for t in times)
+        if len(runs) > 1 and times[0] and times[-1] is not None:
+            line += f"{(times[-1] - times[0]) / times[0] * 100:>+11.1f}%"
+        print(line)
+    # Runs recorded before the field was renamed have peak_rss_mb
+    peaks = [run.get('process_peak_rss_mb', run.get('peak_rss_mb')) for run in runs]
+    print(f"{'process peak RSS (MB)':<22}" + ''.join(f"{peak or '-':>16}" for peak in peaks))
+    print(f"{'matched':<22}" + ''.join(f"{run['matched']:>16}" for run in runs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the SAP/ServiceNow matching pipeline")
+    parser.add_argument('--sap', help="SAP export to load (default: generated)")
+    parser.add_argument('--snow', help="ServiceNow export to load (default: generated)")
+    parser.add_argument('--sap-rows', type=int, default=100000, help="generated SAP open items (default: 100000)")
+    parser.add_argument('--tickets', type=int, default=10000, help="generated tickets (default: 10000)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed of the generated data")
+    parser.add_argument('--work-dir', help="directory for generated data, database and export (default: temporary)")
+    parser.add_argument('--engine', default='python', help="matching engine: python or pandas")
+    parser.add_argument('--reader', default='csv', help="CSV reader: csv or pandas")
+    parser.add_argument('--parallel', action='store_true', help="match tickets in worker processes")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes for --parallel")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="also record the Python allocation peak per stage (slows the run down)")
+    parser.add_argument('--label', help="name of this run in the results, e.g. a branch or change")
+    parser.add_argument('--results', default=DEFAULT_RESULTS_FILE,
+                        help=f"file the results are appended to (default: {DEFAULT_RESULTS_FILE})")
+    parser.add_argument('--compare', nargs='*', metavar='LABEL',
+                        help="compare the runs with these labels (default: the last two) instead of running")
+    args = parser.parse_args(argv)
+
+    if args.compare is not None:
+        compare_results(args.results, args.compare)
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = args.work_dir or temp_dir
+        os.makedirs(work_dir, exist_ok=True)
+
+        sap_file, snow_file = args.sap, args.snow
+        data = {'sap_file': sap_file, 'snow_file': snow_file}
+        if not sap_file or not snow_file:
+            from generate_test_data import generate_test_data
+
+            print(f"Generating {args.sap_rows} SAP items and {args.tickets} tickets...")
+            generated_sap, generated_snow = generate_test_data(work_dir, args.sap_rows, args.tickets, args.seed)
+            sap_file, snow_file = sap_file or generated_sap, snow_file or generated_snow
+            data = {'sap_rows': args.sap_rows, 'tickets': args.tickets, 'seed': args.seed}
+
+        stages, matched = run_benchmark(sap_file, snow_file, work_dir, args.engine, args.reader,
+                                        args.parallel, args.workers, args.trace_memory)
+
+    result = {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'label': args.label,
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'data': data,
+        'options': {'engine': args.engine, 'reader': args.reader, 'parallel': args.parallel,
+                    'workers': args.workers},
+        'stages': stages,
+        'total_seconds': round(sum(stage['seconds'] for stage in stages.values()), 3),
+        'process_peak_rss_mb': peak_rss_mb(),
+        'matched': matched,
+    }
+    with open(args.results, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result) + "\n")
+    print(f"Total {result['total_seconds']:.2f}s, {matched} tickets matched; results appended to {args.results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
 import sqlite3
-import pandas as pd
-import re
 import os
-
-def create_database():
-    """Create SQLite database with snow and sap tables"""
-    conn = sqlite3.connect('ticket_matching.db')
+import time
+import hashlib
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from db_connection import get_connection
+from csv_ingest import read_csv_header, iter_csv_rows, iter_chunks, parse_amount
+from account_index import get_account_index, cached_account_index, invalidate_account_index, SqlAccountLookup
+from account_matcher import (find_matches, find_first_account, configure_valid_account_ranges,
+                             get_valid_account_ranges)
+
+def create_database(db_path=None, stats_cache=True):
+    """
+    Create SQLite database with snow and sap tables (db_path: see db_connection.get_db_path).
+    stats_cache=True also sets up the trigger-maintained stats table read by get_database_stats.
+    """
+    conn = get_connection(db_path)
     cursor = conn.cursor()
 
     # Create snow table with unique constraint on ticket
@@ -29,295 +39,761 @@ def create_database():
         # Column already exists
         pass
 
-    # Create sap table with unique constraint on customer
+    # Add match_fingerprint column if it doesn't exist (for existing databases)
+    try:
+        cursor.execute('ALTER TABLE snow ADD COLUMN match_fingerprint TEXT')
+        conn.commit()
+    except sqlite3.OperationalError:
+        # Column already exists
+        pass
+
+    # Add match_source column if it doesn't exist (for existing databases)
+    try:
+        cursor.execute('ALTER TABLE snow ADD COLUMN match_source TEXT')
+        # Tickets without email text can only have been matched on their description;
+        # the others get a new fingerprint and are re-matched by process_all_tickets
+        cursor.execute(f'''
+            UPDATE snow SET match_source = '{MATCH_SOURCE_DESCRIPTION}'
+            WHERE account_number IS NOT NULL AND account_number != '' AND (text IS NULL OR text = '')
+        ''')
+        conn.commit()
+    except sqlite3.OperationalError:
+        # Column already exists
+        pass
+
+    # Key/value settings such as the SAP data generation
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sap (
-            document_number TEXT,
-            reference TEXT,
-            company_code_currency_value REAL,
-            company_code_currency_key TEXT,
-            name TEXT,
-            customer TEXT,
-            PRIMARY KEY (customer, document_number)
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
         )
     ''')
 
+    # Create sap table with unique constraint on customer
+    cursor.execute(SAP_TABLE_SQL.format(table='sap'))
+
+    # Add row_hash column if it doesn't exist (for existing databases)
+    try:
+        cursor.execute('ALTER TABLE sap ADD COLUMN row_hash TEXT')
+        conn.commit()
+    except sqlite3.OperationalError:
+        # Column already exists
+        pass
+
+    # Lookup indexes for invoice numbers (the primary key only covers customer lookups)
+    create_sap_indexes(cursor)
+
     conn.commit()
+
+    if stats_cache:
+        enable_stats_cache(conn)
+
+    create_search_index(conn)
+
     return conn
 
-def load_sap_data(conn, csv_file='RnB OP.csv'):
-    """Load SAP data from CSV file into sap table (updates existing records)"""
+# Schema of the sap table (also used for the sap_staging table of a reload)
+SAP_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        document_number TEXT,
+        reference TEXT,
+        company_code_currency_value REAL,
+        company_code_currency_key TEXT,
+        name TEXT,
+        customer TEXT,
+        row_hash TEXT,
+        PRIMARY KEY (customer, document_number)
+    )
+'''
+
+# Columns of the sap table that get their own lookup index
+SAP_INDEXED_COLUMNS = ['document_number', 'reference']
+
+def create_sap_indexes(cursor, table='sap', suffix=''):
+    """
+    Create the document_number/reference lookup indexes on the given sap table, unless
+    the column already has an index. Indexes are named idx_sap_<column><suffix>; a staging
+    table gets a unique suffix because its indexes keep their names after the swap.
+    """
+    cursor.execute(f"PRAGMA index_list({table})")
+    index_names = [row[1] for row in cursor.fetchall()]
+
+    indexed_columns = set()
+    for index_name in index_names:
+        cursor.execute(f"PRAGMA index_info({index_name})")
+        columns = [row[2] for row in cursor.fetchall()]
+        if len(columns) == 1:
+            indexed_columns.add(columns[0])
+
+    for column in SAP_INDEXED_COLUMNS:
+        if column not in indexed_columns:
+            cursor.execute(f"CREATE INDEX idx_sap_{column}{suffix} ON {table} ({column})")
+
+def get_meta(conn, key, default=None):
+    """Read a value from the meta table"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT value FROM meta WHERE key = ?", (key,))
+    row = cursor.fetchone()
+    return row[0] if row else default
+
+def set_meta(cursor, key, value):
+    """Write a value to the meta table as part of the caller's transaction"""
+    cursor.execute('''
+        INSERT INTO meta (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    ''', (key, value))
+
+def get_sap_generation(conn):
+    """Current SAP data generation (incremented on every SAP clear/reload)"""
+    return int(get_meta(conn, 'sap_generation', 0))
+
+def bump_sap_generation(cursor):
+    """Increment the SAP data generation as part of the caller's transaction"""
+    cursor.execute('''
+        INSERT INTO meta (key, value) VALUES ('sap_generation', 1)
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+    ''')
+
+def record_sap_file(conn, digest):
+    """Remember which SAP export (by digest) produced the current SAP generation"""
+    cursor = conn.cursor()
+    set_meta(cursor, 'sap_file_digest', digest)
+    set_meta(cursor, 'sap_file_generation', get_sap_generation(conn))
+    conn.commit()
+
+def sap_file_loaded(conn, digest):
+    """True if the sap table still holds exactly the data loaded from the export with this digest"""
+    return (digest == get_meta(conn, 'sap_file_digest')
+            and str(get_sap_generation(conn)) == get_meta(conn, 'sap_file_generation'))
+
+def match_fingerprint(short_description, sap_generation, text=None):
+    """
+    Fingerprint of the inputs of a ticket match: a hash of the description and the
+    extracted email text plus the SAP data generation. A ticket only needs re-matching
+    when its stored fingerprint differs. Tickets without text hash the description only.
+    """
+    content = short_description or ''
+    if text:
+        content += '\x00' + text
+    digest = hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+    return f"{digest}:{sap_generation}"
+
+def file_digest(path):
+    """SHA-1 of a file's contents, used to skip reloading an unchanged SAP export"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Column names in the SAP open item export mapped to the sap table schema
+SAP_COLUMN_MAP = {
+    'Document Number': 'document_number',
+    'Reference': 'reference',
+    'Company Code Currency Value': 'company_code_currency_value',
+    'Company Code Currency Key': 'company_code_currency_key',
+    'Name': 'name',
+    'Customer': 'customer'
+}
+
+SAP_COLUMNS = ['document_number', 'reference', 'company_code_currency_value',
+               'company_code_currency_key', 'name', 'customer']
+
+SAP_CHUNK_SIZE = 50000
+
+# CSV readers: the streaming csv module reader (no pandas needed) or pandas.read_csv
+CSV_READERS = ('csv', 'pandas')
+
+def check_csv_reader(reader):
+    if reader not in CSV_READERS:
+        raise ValueError(f"Unknown CSV reader {reader!r}, expected one of {CSV_READERS}")
+
+def clean_sap_chunk(chunk, invalid_amounts=None):
+    """
+    Clean and type one chunk of SAP data in a vectorized way:
+    - Strip quotes/BOM from headers and rename to the sap schema
+    - IDs and text columns as stripped strings, amounts as floats
+    - Drop rows without a customer
+    Returns a DataFrame with exactly SAP_COLUMNS, missing values as None.
+    Amounts that are not numbers become None; if invalid_amounts is a list, their
+    original values are appended to it.
+    """
+    import pandas as pd
+
+    chunk.columns = chunk.columns.str.strip().str.replace('"', '').str.replace('ï»¿', '').str.replace('\ufeff', '')
+    chunk = chunk.rename(columns=SAP_COLUMN_MAP)
+
+    for column in SAP_COLUMNS:
+        if column not in chunk.columns:
+            chunk[column] = None
+
+    chunk = chunk[SAP_COLUMNS].copy()
+
+    # IDs stay strings so account and invoice numbers keep their exact digits
+    for column in SAP_COLUMNS:
+        if column != 'company_code_currency_value':
+            chunk[column] = chunk[column].astype('string').str.strip()
+
+    # Always floats, also for chunks with only whole numbers, so row hashes do not depend on the chunk
+    amounts = chunk['company_code_currency_value']
+    chunk['company_code_currency_value'] = pd.to_numeric(amounts, errors='coerce').astype('float64')
+
+    # Remove empty rows
+    has_customer = chunk['customer'].notna() & (chunk['customer'] != '')
+    if invalid_amounts is not None:
+        invalid = (has_customer & chunk['company_code_currency_value'].isna()
+                   & amounts.notna() & (amounts.astype('string').str.strip() != ''))
+        invalid_amounts.extend(amounts[invalid].tolist())
+    chunk = chunk[has_customer]
+
+    return chunk.astype(object).where(chunk.notna(), None)
+
+def clean_sap_record(values, invalid_amounts=None):
+    """
+    Clean one row of raw SAP_COLUMNS values the way clean_sap_chunk does.
+    Returns the cleaned tuple, or None if the row has no customer.
+    """
+    row = [None if value is None else value.strip() for value in values]
+    row[2] = parse_amount(values[2])
+    if not row[5]:
+        return None
+    if row[2] is None and values[2] and values[2].strip() and invalid_amounts is not None:
+        invalid_amounts.append(values[2])
+    return tuple(row)
+
+def sap_csv_columns(csv_file):
+    """Header names holding SAP_COLUMNS in the export (export names or sap schema names)"""
+    header = read_csv_header(csv_file)
+    names = {column: column for column in SAP_COLUMNS if column in header}
+    names.update({column: name for name, column in SAP_COLUMN_MAP.items() if name in header})
+    return [names.get(column, column) for column in SAP_COLUMNS]
+
+def sap_row_hash(row):
+    """Content hash of one cleaned SAP row (the SAP_COLUMNS values)"""
+    content = '\x1f'.join('' if value is None else str(value) for value in row)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+def iter_sap_rows(csv_file, reader='csv', invalid_amounts=None):
+    """
+    Read the SAP export in chunks and yield lists of cleaned rows:
+    the SAP_COLUMNS values followed by the row's content hash.
+    reader='csv' streams only the used columns with the csv module, 'pandas' uses
+    pandas.read_csv; both yield the same rows.
+    Amounts that are not numbers are loaded as NULL and, if invalid_amounts is a list,
+    appended to it.
+    """
+    check_csv_reader(reader)
+
+    if reader == 'pandas':
+        import pandas as pd
+
+        for chunk in pd.read_csv(csv_file, chunksize=SAP_CHUNK_SIZE, dtype=str):
+            chunk = clean_sap_chunk(chunk, invalid_amounts)
+            yield [row + (sap_row_hash(row),) for row in chunk.itertuples(index=False, name=None)]
+        return
+
+    records = (clean_sap_record(values, invalid_amounts)
+               for values in iter_csv_rows(csv_file, sap_csv_columns(csv_file)))
+    for chunk in iter_chunks((row for row in records if row is not None), SAP_CHUNK_SIZE):
+        yield [row + (sap_row_hash(row),) for row in chunk]
+
+# Unparseable SAP amounts quoted in the load warning
+INVALID_AMOUNT_EXAMPLES = 5
+
+def insert_sap_rows(conn, table, csv_file, progress_callback=None, reader='csv'):
+    """
+    Insert all rows of the SAP export into table, reporting rows/second and warning about
+    amounts that are not numbers (loaded as NULL). Returns the row count.
+    """
     cursor = conn.cursor()
+    total_loaded = 0
+    invalid_amounts = []
+    start_time = time.perf_counter()
+
+    for rows in iter_sap_rows(csv_file, reader, invalid_amounts):
+        cursor.executemany(f'''
+            INSERT OR REPLACE INTO {table}
+            (document_number, reference, company_code_currency_value,
+             company_code_currency_key, name, customer, row_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+        total_loaded += len(rows)
+        elapsed = time.perf_counter() - start_time
+        rate = total_loaded / elapsed if elapsed > 0 else 0
+        print(f"Loaded {total_loaded} records... ({rate:,.0f} rows/s)")
+        if progress_callback:
+            progress_callback(f"Loaded {total_loaded} SAP records ({rate:,.0f} rows/s)")
+
+    if invalid_amounts:
+        examples = ', '.join(repr(value) for value in invalid_amounts[:INVALID_AMOUNT_EXAMPLES])
+        message = (f"Warning: {len(invalid_amounts)} SAP amounts are not numbers and were loaded "
+                   f"as empty (e.g. {examples})")
+        print(message)
+        if progress_callback:
+            progress_callback(message)
+
+    return total_loaded
+
+def load_sap_data(conn, csv_file='RnB OP.csv', progress_callback=None, reader='csv'):
+    """
+    Load SAP data from CSV file, replacing the sap table.
+    Rows are loaded and indexed in a sap_staging table that is then swapped in for sap in a
+    single transaction, so readers never see a partially loaded table. If the load fails
+    the previous SAP data stays in place and the error is raised.
+    Returns the number of records loaded.
+    """
+    cursor = conn.cursor()
+
+    conn.commit()
+    cursor.execute("DROP TABLE IF EXISTS sap_staging")
+    cursor.execute(SAP_TABLE_SQL.format(table='sap_staging'))
+    conn.commit()
 
     try:
-        # Read CSV file in chunks to handle large files
-        chunk_size = 1000
-        total_loaded = 0
-
-        for chunk in pd.read_csv(csv_file, chunksize=chunk_size):
-            # Clean column names and rename to match our schema
-            chunk.columns = chunk.columns.str.strip().str.replace('"', '').str.replace('ï»¿', '')
-            chunk = chunk.rename(columns={
-                'Document Number': 'document_number',
-                'Reference': 'reference',
-                'Company Code Currency Value': 'company_code_currency_value',
-                'Company Code Currency Key': 'company_code_currency_key',
-                'Name': 'name',
-                'Customer': 'customer'
-            })
-
-            # Remove empty rows
-            chunk = chunk.dropna(subset=['customer']).copy()
-            chunk = chunk[chunk['customer'] != '']
-
-            # Insert records one by one to avoid SQL variable limit
-            for _, row in chunk.iterrows():
-                cursor.execute('''
-                    INSERT OR REPLACE INTO sap
-                    (document_number, reference, company_code_currency_value,
-                     company_code_currency_key, name, customer)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (row.get('document_number', ''), row.get('reference', ''),
-                      row.get('company_code_currency_value', 0),
-                      row.get('company_code_currency_key', ''),
-                      row.get('name', ''), row.get('customer', '')))
-
-            total_loaded += len(chunk)
-            if total_loaded % 5000 == 0:
-                print(f"Loaded {total_loaded} records...")
+        # Read CSV file in chunks to handle large files, all chunks in one transaction
+        start_time = time.perf_counter()
+        total_loaded = insert_sap_rows(conn, 'sap_staging', csv_file, progress_callback, reader)
 
+        # Build the lookup indexes before the swap, named after the generation they belong to
+        create_sap_indexes(cursor, table='sap_staging', suffix=f'_g{get_sap_generation(conn) + 1}')
         conn.commit()
-        print(f"Loaded {total_loaded} records into sap table")
+
+        swap_sap_staging(conn)
+
+        elapsed = time.perf_counter() - start_time
+        rate = total_loaded / elapsed if elapsed > 0 else 0
+        print(f"Loaded {total_loaded} records into sap table in {elapsed:.1f}s ({rate:,.0f} rows/s)")
+        return total_loaded
 
     except Exception as e:
-        print(f"Error loading SAP data: {e}")
+        conn.rollback()
+        cursor.execute("DROP TABLE IF EXISTS sap_staging")
+        conn.commit()
+        print(f"Error loading SAP data, previous SAP data kept: {e}")
+        raise
+
+def load_sap_data_differential(conn, csv_file='RnB OP.csv', progress_callback=None, reader='csv'):
+    """
+    Apply only the differences between the SAP export and the sap table:
+    rows are keyed on (customer, document_number) and compared by content hash;
+    new items are inserted, changed items updated and cleared items deleted, in one
+    transaction. The SAP generation is only incremented if anything changed.
+    Returns (added, changed, removed).
+    """
+    cursor = conn.cursor()
+    start_time = time.perf_counter()
+
+    conn.commit()
+    cursor.execute(SAP_TABLE_SQL.format(table='temp.sap_incoming'))
+    cursor.execute("DELETE FROM sap_incoming")
+
+    try:
+        insert_sap_rows(conn, 'sap_incoming', csv_file, progress_callback, reader)
+        conn.commit()
+
+        cursor.execute("BEGIN IMMEDIATE")
+
+        # Cleared items: no longer in the export
+        cursor.execute('''
+            DELETE FROM sap
+            WHERE NOT EXISTS (
+                SELECT 1 FROM sap_incoming AS i
+                WHERE i.customer = sap.customer AND i.document_number IS sap.document_number
+            )
+        ''')
+        removed = cursor.rowcount
+
+        # Changed items: same key, different content hash
+        cursor.execute('''
+            UPDATE sap
+            SET reference = i.reference,
+                company_code_currency_value = i.company_code_currency_value,
+                company_code_currency_key = i.company_code_currency_key,
+                name = i.name,
+                row_hash = i.row_hash
+            FROM sap_incoming AS i
+            WHERE i.customer = sap.customer AND i.document_number IS sap.document_number
+            AND i.row_hash IS NOT sap.row_hash
+        ''')
+        changed = cursor.rowcount
+
+        # New items
+        cursor.execute('''
+            INSERT INTO sap
+            (document_number, reference, company_code_currency_value,
+             company_code_currency_key, name, customer, row_hash)
+            SELECT document_number, reference, company_code_currency_value,
+                   company_code_currency_key, name, customer, row_hash
+            FROM sap_incoming AS i
+            WHERE NOT EXISTS (
+                SELECT 1 FROM sap
+                WHERE sap.customer = i.customer AND sap.document_number IS i.document_number
+            )
+        ''')
+        added = cursor.rowcount
+
+        if added or changed or removed:
+            bump_sap_generation(cursor)
+        conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Error applying SAP differences, previous SAP data kept: {e}")
+        raise
+
+    finally:
+        cursor.execute("DROP TABLE IF EXISTS temp.sap_incoming")
+
+    if added or changed or removed:
+        invalidate_account_index()
+
+    elapsed = time.perf_counter() - start_time
+    message = f"SAP differential load: {added} added, {changed} changed, {removed} removed in {elapsed:.1f}s"
+    print(message)
+    if progress_callback:
+        progress_callback(message)
+    return added, changed, removed
+
+def swap_sap_staging(conn):
+    """Replace the sap table with the loaded sap_staging table in one transaction"""
+    cursor = conn.cursor()
+
+    conn.commit()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("DROP TABLE IF EXISTS sap")
+        cursor.execute("ALTER TABLE sap_staging RENAME TO sap")
+        bump_sap_generation(cursor)
+
+        # The sap stats triggers were dropped with the old table
+        if stats_cache_enabled(conn):
+            create_sap_stats_triggers(cursor)
+            cursor.execute("UPDATE stats SET sap_records = (SELECT COUNT(*) FROM sap)")
 
-def load_snow_data(conn, csv_file=None, tickets_data=None):
-    """Load ServiceNow data from CSV file or list into snow table (preserves existing data)"""
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    invalidate_account_index()
+
+def upsert_snow_rows(conn, rows, update_existing=True):
+    """
+    Set-based upsert of (ticket, short_description, eml_domain, account_number,
+    account_name, text) rows into the snow table via a temp staging table.
+    New tickets are inserted as given. Existing tickets only get short_description
+    and eml_domain updated (update_existing=True) or are left untouched.
+    Returns (new_tickets, updated_tickets); a ticket repeated in rows counts as
+    new once and updated for every further occurrence.
+    """
     cursor = conn.cursor()
 
+    cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS snow_staging (
+            seq INTEGER PRIMARY KEY,
+            ticket TEXT,
+            short_description TEXT,
+            eml_domain TEXT,
+            account_number TEXT,
+            account_name TEXT,
+            text TEXT
+        )
+    ''')
+    cursor.execute("DELETE FROM snow_staging")
+    cursor.executemany('''
+        INSERT INTO snow_staging (ticket, short_description, eml_domain, account_number, account_name, text)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+    cursor.execute("SELECT COUNT(*) FROM snow_staging WHERE ticket IS NOT NULL")
+    staged = cursor.fetchone()[0]
+    cursor.execute('''
+        SELECT COUNT(DISTINCT ticket) FROM snow_staging
+        WHERE ticket IS NOT NULL AND ticket NOT IN (SELECT ticket FROM snow WHERE ticket IS NOT NULL)
+    ''')
+    new_tickets = cursor.fetchone()[0]
+
+    # Existing tickets: only description and email domain change, extracted data is preserved
+    if update_existing:
+        conflict_action = '''DO UPDATE SET short_description = excluded.short_description,
+                                     eml_domain = excluded.eml_domain'''
+    else:
+        conflict_action = 'DO NOTHING'
+
+    cursor.execute(f'''
+        INSERT INTO snow (ticket, short_description, eml_domain, account_number, account_name, text, extraction_status)
+        SELECT ticket, short_description, eml_domain, account_number, account_name, text, NULL
+        FROM snow_staging
+        WHERE ticket IS NOT NULL
+        ORDER BY seq
+        ON CONFLICT(ticket) {conflict_action}
+    ''')
+    cursor.execute("DELETE FROM snow_staging")
+
+    updated_tickets = staged - new_tickets if update_existing else 0
+    return new_tickets, updated_tickets
+
+# Columns of the sc_req_item.csv export:
+# number, state, assigned_to, sys_created_on, sys_updated_on, short_description, u_sender_address, sys_updated_by, assignment_group
+SNOW_EXPORT_COLUMNS = ['number', 'short_description', 'u_sender_address']
+
+def email_domain(sender):
+    """Domain part of a sender address, None if it has no @"""
+    if sender is None or '@' not in sender:
+        return None
+    return sender.split('@')[1]
+
+def iter_snow_rows(csv_file):
+    """
+    Stream (ticket, short_description, eml_domain, account_number, account_name, text) rows
+    from a ServiceNow export with the csv module, reading only the used columns.
+    """
+    header = read_csv_header(csv_file)
+
+    if 'number' in header and 'short_description' in header:
+        # New tickets get NULL values for preserved fields
+        for number, short_description, sender in iter_csv_rows(csv_file, SNOW_EXPORT_COLUMNS):
+            yield number, short_description, email_domain(sender), None, None, None
+    else:
+        # Generic format: TICKET, short description, eml_domain, account number, Account Name
+        for values in iter_csv_rows(csv_file, range(5)):
+            yield values + (None,)
+
+def read_snow_rows_pandas(csv_file):
+    """pandas.read_csv counterpart of iter_snow_rows (reads the whole file at once)"""
+    import pandas as pd
+
+    df = pd.read_csv(csv_file, dtype=str)
+    df = df.astype(object).where(df.notna(), None)
+
+    if 'number' in df.columns and 'short_description' in df.columns:
+        # Extract email domain from u_sender_address
+        if 'u_sender_address' in df.columns:
+            senders = df['u_sender_address'].astype('string')
+            domains = senders.str.split('@').str[1].where(senders.str.contains('@', regex=False))
+            domains = domains.astype(object).where(domains.notna(), None)
+        else:
+            domains = [None] * len(df)
+
+        return zip(df['number'], df['short_description'], domains, *([[None] * len(df)] * 3))
+
+    columns = [df.iloc[:, i] if len(df.columns) > i else [None] * len(df) for i in range(5)]
+    return zip(*columns, [None] * len(df))
+
+def load_snow_data(conn, csv_file=None, tickets_data=None, reader='csv'):
+    """
+    Load ServiceNow data from CSV file or list into snow table (preserves existing data).
+    reader='csv' streams the file with the csv module, 'pandas' uses pandas.read_csv.
+    """
+    new_tickets = 0
+    updated_tickets = 0
+
     if csv_file:
+        check_csv_reader(reader)
         try:
-            df = pd.read_csv(csv_file)
-            new_tickets = 0
-            updated_tickets = 0
-
-            # Handle sc_req_item.csv format: number, state, assigned_to, sys_created_on, sys_updated_on, short_description, u_sender_address, sys_updated_by, assignment_group
-            if 'number' in df.columns and 'short_description' in df.columns:
-                for _, row in df.iterrows():
-                    ticket_number = row['number']
-
-                    # Check if ticket already exists
-                    cursor.execute('SELECT ticket, account_number, account_name, text, extraction_status FROM snow WHERE ticket = ?', (ticket_number,))
-                    existing = cursor.fetchone()
-
-                    # Extract email domain from u_sender_address
-                    email_domain = None
-                    if 'u_sender_address' in row and pd.notna(row['u_sender_address']):
-                        email = str(row['u_sender_address'])
-                        if '@' in email:
-                            email_domain = email.split('@')[1]
-
-                    if existing:
-                        # Ticket exists - only update description and email domain, preserve other data
-                        cursor.execute('''
-                            UPDATE snow
-                            SET short_description = ?, eml_domain = ?
-                            WHERE ticket = ?
-                        ''', (row['short_description'], email_domain, ticket_number))
-                        updated_tickets += 1
-                    else:
-                        # New ticket - insert with NULL values for preserved fields
-                        cursor.execute('''
-                            INSERT INTO snow (ticket, short_description, eml_domain, account_number, account_name, text, extraction_status)
-                            VALUES (?, ?, ?, NULL, NULL, NULL, NULL)
-                        ''', (ticket_number, row['short_description'], email_domain))
-                        new_tickets += 1
-            else:
-                # Generic format: TICKET, short description, eml_domain, account number, Account Name
-                for _, row in df.iterrows():
-                    ticket_number = row[0]
-
-                    # Check if ticket already exists
-                    cursor.execute('SELECT ticket FROM snow WHERE ticket = ?', (ticket_number,))
-                    existing = cursor.fetchone()
-
-                    if existing:
-                        # Ticket exists - only update basic info, preserve extracted data
-                        cursor.execute('''
-                            UPDATE snow
-                            SET short_description = ?, eml_domain = ?
-                            WHERE ticket = ?
-                        ''', (row[1], row[2] if len(row) > 2 else None, ticket_number))
-                        updated_tickets += 1
-                    else:
-                        # New ticket - insert fresh
-                        cursor.execute('''
-                            INSERT INTO snow (ticket, short_description, eml_domain, account_number, account_name, text, extraction_status)
-                            VALUES (?, ?, ?, ?, ?, NULL, NULL)
-                        ''', (ticket_number, row[1], row[2] if len(row) > 2 else None,
-                             row[3] if len(row) > 3 else None, row[4] if len(row) > 4 else None))
-                        new_tickets += 1
+            rows = iter_snow_rows(csv_file) if reader == 'csv' else read_snow_rows_pandas(csv_file)
+            new_tickets, updated_tickets = upsert_snow_rows(conn, rows)
 
             conn.commit()
             print(f"Loaded from {csv_file}: {new_tickets} new tickets, {updated_tickets} existing tickets updated")
         except Exception as e:
+            conn.rollback()
             print(f"Error loading ServiceNow data: {e}")
 
     elif tickets_data:
-        new_tickets = 0
-        for ticket_data in tickets_data:
-            ticket_number = ticket_data[0]
-
-            # Check if ticket exists
-            cursor.execute('SELECT ticket FROM snow WHERE ticket = ?', (ticket_number,))
-            existing = cursor.fetchone()
-
-            if not existing:
-                cursor.execute('''
-                    INSERT INTO snow (ticket, short_description, eml_domain, account_number, account_name, text, extraction_status)
-                    VALUES (?, ?, ?, ?, ?, ?, NULL)
-                ''', ticket_data)
-                new_tickets += 1
+        # Existing tickets are left untouched
+        new_tickets, _ = upsert_snow_rows(conn, tickets_data, update_existing=False)
 
         conn.commit()
         print(f"Loaded {new_tickets} new tickets from provided data")
 
-def is_valid_account_range(account_number):
+    return new_tickets, updated_tickets
+
+def find_account_matches(short_description, conn):
     """
-    Check if account number is in valid ranges:
-    20600000-20699999, 25300000-25399999, 20300000-24999999, 25900000-25999999
+    Find account matches based on the description (see account_matcher for the rules).
+    SAP lookups go through the in-memory AccountIndex of this database when it is built;
+    otherwise a one-off lookup runs SQL queries instead of building the whole index.
     """
-    try:
-        num = int(account_number)
-        return (
-            (20600000 <= num <= 20699999) or
-            (25300000 <= num <= 25399999) or
-            (20300000 <= num <= 24999999) or
-            (25900000 <= num <= 25999999)
-        )
-    except (ValueError, TypeError):
-        return False
+    index = cached_account_index(conn, get_sap_generation(conn))
+    if index is None:
+        index = SqlAccountLookup(conn)
+    return find_matches(short_description, index)
 
-def find_account_matches(short_description, conn):
+# Tickets read, matched and written back per page in process_all_tickets
+MATCH_PAGE_SIZE = 5000
+
+def iter_ticket_pages(conn, sap_generation, force_full=False, page_size=MATCH_PAGE_SIZE):
     """
-    Find account matches based on the description using the specified logic:
-    - 10 digits starting with 00: drop 00, look up 8 digits in customer
-    - 8 digits: look up directly in customer
-    - 10 digits NOT starting with 00: look up in document_number or reference
-    - XXX-XXXXX format: combine digits and try as 8-digit customer lookup
-    - XX-XXXXXX format: combine digits and try as 8-digit customer lookup
-    - Valid range check: if account is in valid ranges, accept even if not in SAP
+    Yield (ticket, short_description, text) pages of tickets that need matching, in ticket order.
+    Uses keyset pagination, so pages stay cheap and the full list is never held in memory.
     """
     cursor = conn.cursor()
-    matches = []
-
-    # Extract regular numbers from description (8-10 digits)
-    numbers = re.findall(r'\b\d{8,10}\b', short_description)
-
-    # Extract dash-separated formats like "239-63450" and "20-572883"
-    dash_numbers_3_5 = re.findall(r'\b(\d{3})-(\d{5})\b', short_description)
-    dash_numbers_2_6 = re.findall(r'\b(\d{2})-(\d{6})\b', short_description)
-
-    # Process dash-separated numbers first
-    # Handle XXX-XXXXX format (3-5 digits)
-    for part1, part2 in dash_numbers_3_5:
-        combined = part1 + part2  # "239" + "63450" = "23963450"
-        if len(combined) == 8:
-            # First try SAP lookup
-            cursor.execute("SELECT * FROM sap WHERE customer = ?", (combined,))
-            results = cursor.fetchall()
-            if results:
-                matches.extend([(combined, 'customer_dash', result) for result in results])
-            elif is_valid_account_range(combined):
-                # Valid range but not in SAP - create fake record
-                fake_record = ('', '', 0, '', 'VALID ACCOUNT (NOT IN SAP)', combined)
-                matches.extend([(combined, 'customer_dash_valid', fake_record)])
-
-    # Handle XX-XXXXXX format (2-6 digits)
-    for part1, part2 in dash_numbers_2_6:
-        combined = part1 + part2  # "20" + "572883" = "20572883"
-        if len(combined) == 8:
-            # First try SAP lookup
-            cursor.execute("SELECT * FROM sap WHERE customer = ?", (combined,))
-            results = cursor.fetchall()
-            if results:
-                matches.extend([(combined, 'customer_dash', result) for result in results])
-            elif is_valid_account_range(combined):
-                # Valid range but not in SAP - create fake record
-                fake_record = ('', '', 0, '', 'VALID ACCOUNT (NOT IN SAP)', combined)
-                matches.extend([(combined, 'customer_dash_valid', fake_record)])
-
-    # Process regular numbers
-    for number in numbers:
-        if len(number) == 10 and number.startswith('00'):
-            # Drop 00 and look up 8 digit number in customer
-            account_num = number[2:]
-            cursor.execute("SELECT * FROM sap WHERE customer = ?", (account_num,))
-            results = cursor.fetchall()
-            if results:
-                matches.extend([(account_num, 'customer', result) for result in results])
-            elif is_valid_account_range(account_num):
-                # Valid range but not in SAP
-                fake_record = ('', '', 0, '', 'VALID ACCOUNT (NOT IN SAP)', account_num)
-                matches.extend([(account_num, 'customer_valid', fake_record)])
-
-        elif len(number) == 8:
-            # Look up directly in customer
-            cursor.execute("SELECT * FROM sap WHERE customer = ?", (number,))
-            results = cursor.fetchall()
-            if results:
-                matches.extend([(number, 'customer', result) for result in results])
-            elif is_valid_account_range(number):
-                # Valid range but not in SAP
-                fake_record = ('', '', 0, '', 'VALID ACCOUNT (NOT IN SAP)', number)
-                matches.extend([(number, 'customer_valid', fake_record)])
-
-        elif len(number) == 10 and not number.startswith('00'):
-            # Look up in document_number or reference (invoice number)
-            cursor.execute("SELECT * FROM sap WHERE document_number = ? OR reference = ?", (number, number))
-            results = cursor.fetchall()
-            if results:
-                matches.extend([(number, 'invoice', result) for result in results])
-
-    return matches
-
-def process_all_tickets(conn):
-    """Process all tickets and find account matches"""
-    cursor = conn.cursor()
+    conn.create_function('ticket_fingerprint', 3, match_fingerprint, deterministic=True)
+
+    # Without force_full only tickets that are new, have a changed description or email text,
+    # or were matched against older SAP data are selected
+    condition = '' if force_full else 'AND match_fingerprint IS NOT ticket_fingerprint(short_description, ?, text)'
+    last_ticket = ''
+
+    while True:
+        params = (last_ticket,) if force_full else (last_ticket, sap_generation)
+        cursor.execute(f'''
+            SELECT ticket, short_description, text FROM snow
+            WHERE ticket > ? {condition}
+            ORDER BY ticket
+            LIMIT {int(page_size)}
+        ''', params)
+        page = cursor.fetchall()
+        if not page:
+            break
+        yield page
+        last_ticket = page[-1][0]
+
+# Matching engines of process_all_tickets: per-ticket Python loop or vectorized numpy batches
+# ('pandas': numpy is installed with pandas)
+MATCH_ENGINES = ('python', 'pandas')
+
+# Default page size of the pandas engine (larger pages are not faster, only use more memory)
+BATCH_MATCH_PAGE_SIZE = 10000
+
+# snow.match_source values: where the ticket's account was found
+MATCH_SOURCE_DESCRIPTION = 'description'
+MATCH_SOURCE_TEXT = 'text'
+
+def first_accounts(texts, index, engine='python'):
+    """find_first_account for each text, per text ('python') or in one vectorized batch ('pandas')"""
+    if engine == 'pandas':
+        # Imported on first use, only this engine needs numpy
+        from batch_matcher import first_matches
+        return first_matches(texts, index)
+    return [find_first_account(text, index) for text in texts]
+
+def match_ticket_page(page, index, sap_generation, engine='python'):
+    """
+    Match one page of (ticket, short_description, text) rows: the description first and,
+    when it has no match, the extracted email text.
+    Returns (account_number, account_name, match_fingerprint, match_source, ticket, match_type)
+    rows, with account_number/account_name/match_source/match_type None when neither matches.
+    engine='pandas' matches the page with the vectorized batch_matcher instead of
+    one find_first_match call per ticket; the results are the same.
+    """
+    matches = first_accounts([description for _, description, _ in page], index, engine)
+    sources = [MATCH_SOURCE_DESCRIPTION if match else None for match in matches]
+
+    # Stored email text of tickets whose description has no match
+    text_rows = [row for row, ((_, _, text), match) in enumerate(zip(page, matches)) if text and not match]
+    if text_rows:
+        text_matches = first_accounts([page[row][2] for row in text_rows], index, engine)
+        for row, match in zip(text_rows, text_matches):
+            if match:
+                matches[row] = match
+                sources[row] = MATCH_SOURCE_TEXT
+
+    results = []
+    for (ticket_num, description, text), match, source in zip(page, matches, sources):
+        fingerprint = match_fingerprint(description, sap_generation, text)
+
+        if match:
+            # Take the first match for account assignment
+            account_number, account_name, match_type = match
+            results.append((account_number, account_name, fingerprint, source, ticket_num, match_type))
+        else:
+            # Clear account info if neither the description nor the text matches
+            results.append((None, None, fingerprint, None, ticket_num, None))
+    return results
+
+def write_match_results(cursor, results):
+    """Apply match_ticket_page results to the snow table with one executemany"""
+    cursor.executemany('''
+        UPDATE snow
+        SET account_number = ?, account_name = ?, match_fingerprint = ?, match_source = ?
+        WHERE ticket = ?
+    ''', (result[:5] for result in results))
+
+# Matching state of a parallel worker process, set once by init_match_worker
+_worker_index = None
+
+def init_match_worker(index, valid_ranges):
+    """ProcessPoolExecutor initializer: receive a read-only snapshot of the SAP lookup data"""
+    global _worker_index
+    _worker_index = index
+    configure_valid_account_ranges(valid_ranges)
+
+def match_ticket_page_in_worker(page, sap_generation, engine='python'):
+    """Match one page in a worker process against its SAP snapshot"""
+    return match_ticket_page(page, _worker_index, sap_generation, engine)
+
+def iter_match_results(pages, index, sap_generation, parallel=False, workers=None, engine='python'):
+    """
+    Yield match_ticket_page results for each page, in page order.
+    In parallel mode pages are matched by a ProcessPoolExecutor with workers processes
+    (default: CPU count); at most two pages per worker are in flight at a time.
+    """
+    if not parallel:
+        for page in pages:
+            yield match_ticket_page(page, index, sap_generation, engine)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_match_worker,
+                             initargs=(index, get_valid_account_ranges())) as executor:
+        pending = deque()
+        for page in pages:
+            pending.append(executor.submit(match_ticket_page_in_worker, page, sap_generation, engine))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def process_all_tickets(conn, force_full=False, page_size=None, verbose=False,
+                        parallel=False, workers=None, engine='python'):
+    """
+    Find account matches for new or changed tickets, in the description and, when it
+    has no match, in the email text stored by the scraper (snow.match_source records which).
+    Only tickets whose match fingerprint (description and text hash + SAP generation) changed
+    since their last match are processed, so after a SAP reload every ticket is.
+    force_full=True re-matches every ticket regardless of fingerprint.
+    Tickets are streamed in pages of page_size; each page is written back with one
+    executemany and committed. verbose=True prints one line per ticket, otherwise only
+    summary counts by match type are printed.
+    parallel=True matches pages in worker processes (workers, default: CPU count);
+    results come back in page order and are written by this connection only.
+    engine selects the matcher: 'python' (per ticket) or 'pandas' (vectorized batches,
+    default page size BATCH_MATCH_PAGE_SIZE); both give the same results.
+    """
+    if engine not in MATCH_ENGINES:
+        raise ValueError(f"Unknown matching engine: {engine} (expected one of {', '.join(MATCH_ENGINES)})")
+    if page_size is None:
+        page_size = BATCH_MATCH_PAGE_SIZE if engine == 'pandas' else MATCH_PAGE_SIZE
 
-    # Get all tickets without account assignments or with outdated assignments
-    cursor.execute("SELECT ticket, short_description FROM snow")
-    tickets = cursor.fetchall()
+    cursor = conn.cursor()
+    sap_generation = get_sap_generation(conn)
+    index = get_account_index(conn, sap_generation)
 
-    matched_count = 0
-    for ticket_num, description in tickets:
-        matches = find_account_matches(description, conn)
+    match_type_counts = Counter()
+    text_matches = 0
+    processed = 0
 
-        if matches:
-            # Take the first match for account assignment
-            number, match_type, sap_record = matches[0]
-            account_number = sap_record[5] if sap_record[5] else number  # customer field
-            account_name = sap_record[4] if sap_record[4] else ''  # name field
-
-            # Update ticket with account info
-            cursor.execute('''
-                UPDATE snow
-                SET account_number = ?, account_name = ?
-                WHERE ticket = ?
-            ''', (account_number, account_name, ticket_num))
-
-            matched_count += 1
-            print(f"Ticket {ticket_num}: Matched to account {account_number} via {match_type}")
-        else:
-            # Clear account info if no matches found
-            cursor.execute('''
-                UPDATE snow
-                SET account_number = NULL, account_name = NULL
-                WHERE ticket = ?
-            ''', (ticket_num,))
+    pages = iter_ticket_pages(conn, sap_generation, force_full, page_size)
+    for results in iter_match_results(pages, index, sap_generation, parallel, workers, engine):
+        write_match_results(cursor, results)
+        conn.commit()
 
-    conn.commit()
+        for account_number, _, _, source, ticket_num, match_type in results:
+            match_type_counts[match_type or 'no_match'] += 1
+            if source == MATCH_SOURCE_TEXT:
+                text_matches += 1
+            if verbose and match_type:
+                print(f"Ticket {ticket_num}: Matched to account {account_number} via {match_type} in {source}")
+        processed += len(results)
+
+    matched_count = processed - match_type_counts['no_match']
+    print(f"Re-matched {processed} tickets ({'full' if force_full else 'incremental'}), "
+          f"{matched_count} matched ({text_matches} from email text)")
+    for match_type, count in sorted(match_type_counts.items()):
+        print(f"  {match_type}: {count}")
     return matched_count
 
 def show_results(conn):
@@ -354,29 +830,55 @@ def clear_sap_data(conn):
     """Clear all SAP data to prepare for fresh load"""
     cursor = conn.cursor()
     cursor.execute("DELETE FROM sap")
+    cursor.execute("DELETE FROM meta WHERE key IN ('sap_file_digest', 'sap_file_generation')")
+    bump_sap_generation(cursor)
     conn.commit()
+    invalidate_account_index()
     print("Cleared existing SAP data")
 
-def update_database(sap_file=None, snow_file=None, snow_data=None, progress_callback=None):
-    """Update database with new data files"""
-    conn = create_database()
+def update_database(sap_file=None, snow_file=None, snow_data=None, progress_callback=None,
+                    force_rematch=False, verbose=False, parallel=False, workers=None, db_path=None,
+                    differential_sap=False, engine='python', reader='csv'):
+    """
+    Update database with new data files.
+    An unchanged SAP file (same contents as the last load) is not reloaded.
+    Only new/changed tickets are re-matched unless SAP data was reloaded or force_rematch
+    is set, which also forces the SAP reload. verbose=True prints every ticket match.
+    parallel=True spreads matching over workers processes (default: CPU count).
+    differential_sap=True applies only added/changed/removed SAP items instead of a full reload.
+    engine selects the ticket matcher: 'python' or the vectorized 'pandas' batch engine.
+    reader selects the CSV reader: the streaming 'csv' module reader or 'pandas'.
+    Returns the number of matched tickets in the database (not only the ones re-matched
+    by this run, which is 0 when nothing changed).
+    """
+    conn = create_database(db_path)
 
     if progress_callback:
         progress_callback("Creating database structure...")
 
     if sap_file and os.path.exists(sap_file):
-        if progress_callback:
-            progress_callback(f"Clearing old SAP data...")
-        clear_sap_data(conn)
-
-        if progress_callback:
-            progress_callback(f"Loading SAP data from {sap_file}...")
-        load_sap_data(conn, sap_file)
+        sap_digest = file_digest(sap_file)
+
+        if not force_rematch and sap_file_loaded(conn, sap_digest):
+            # Same export as last time - keep SAP data (and its generation) as it is
+            if progress_callback:
+                progress_callback(f"SAP data unchanged, skipping reload of {sap_file}")
+        elif differential_sap:
+            if progress_callback:
+                progress_callback(f"Applying SAP changes from {sap_file}...")
+            load_sap_data_differential(conn, sap_file, progress_callback=progress_callback, reader=reader)
+            record_sap_file(conn, sap_digest)
+        else:
+            # Loaded into a staging table and swapped in, old data stays until the load succeeded
+            if progress_callback:
+                progress_callback(f"Loading SAP data from {sap_file}...")
+            load_sap_data(conn, sap_file, progress_callback=progress_callback, reader=reader)
+            record_sap_file(conn, sap_digest)
 
     if snow_file and os.path.exists(snow_file):
         if progress_callback:
             progress_callback(f"Loading ServiceNow data from {snow_file}...")
-        load_snow_data(conn, csv_file=snow_file)
+        load_snow_data(conn, csv_file=snow_file, reader=reader)
 
     if snow_data:
         if progress_callback:
@@ -385,51 +887,276 @@ def update_database(sap_file=None, snow_file=None, snow_data=None, progress_call
 
     if progress_callback:
         progress_callback("Processing ticket matches...")
-    matched = process_all_tickets(conn)
+    new_matches = process_all_tickets(conn, force_full=force_rematch, verbose=verbose,
+                                      parallel=parallel, workers=workers, engine=engine)
+    matched = get_database_stats(db_path)['matched_tickets']
 
     if progress_callback:
-        progress_callback(f"Complete! {matched} new matches found")
+        if new_matches:
+            progress_callback(f"Complete! {matched} tickets matched ({new_matches} by this run)")
+        else:
+            progress_callback(f"Complete! No new matches, {matched} tickets matched")
 
-    conn.close()
     return matched
 
-def get_database_stats():
-    """Get current database statistics"""
-    conn = sqlite3.connect('ticket_matching.db')
+# Counters of get_database_stats and the snow row condition each one counts
+# ({row} is NEW or OLD inside the stats triggers)
+SNOW_STATS_CONDITIONS = {
+    'total_tickets': "1",
+    'matched_tickets': "{row}.account_number IS NOT NULL AND {row}.account_number != ''",
+    'extracted_count': "{row}.extraction_status = 'extracted'",
+    'nothing_to_extract_count': "{row}.extraction_status = 'nothing_to_extract'",
+    'pending_extraction_count': "{row}.extraction_status IS NULL OR {row}.extraction_status = ''",
+}
+
+STATS_COLUMNS = list(SNOW_STATS_CONDITIONS) + ['sap_records']
+
+def snow_stats_flag(column, row):
+    """SQL expression that is 1 if the snow row counts towards column, else 0"""
+    condition = SNOW_STATS_CONDITIONS[column].format(row=row)
+    return f"(CASE WHEN {condition} THEN 1 ELSE 0 END)"
+
+def compute_stats(conn):
+    """All counters with one aggregate pass over snow plus a count of sap"""
     cursor = conn.cursor()
+    sums = ',\n'.join(f"COALESCE(SUM({snow_stats_flag(column, 'snow')}), 0)"
+                      for column in SNOW_STATS_CONDITIONS)
+    cursor.execute(f"SELECT {sums} FROM snow")
+    counts = dict(zip(SNOW_STATS_CONDITIONS, cursor.fetchone()))
 
-    # Total tickets
-    cursor.execute("SELECT COUNT(*) FROM snow")
-    total_tickets = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM sap")
+    counts['sap_records'] = cursor.fetchone()[0]
+    return counts
+
+def create_sap_stats_triggers(cursor):
+    """Keep stats.sap_records up to date on sap inserts and deletes"""
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS stats_sap_insert AFTER INSERT ON sap
+        BEGIN UPDATE stats SET sap_records = sap_records + 1; END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS stats_sap_delete AFTER DELETE ON sap
+        BEGIN UPDATE stats SET sap_records = sap_records - 1; END
+    ''')
 
-    # Matched tickets
-    cursor.execute("SELECT COUNT(*) FROM snow WHERE account_number IS NOT NULL AND account_number != ''")
-    matched_tickets = cursor.fetchone()[0]
+def stats_cache_enabled(conn):
+    """True if the trigger-maintained stats table exists"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats'")
+    return cursor.fetchone() is not None
 
-    # Extraction status counts
-    cursor.execute("SELECT COUNT(*) FROM snow WHERE extraction_status = 'extracted'")
-    extracted_count = cursor.fetchone()[0]
+def enable_stats_cache(conn):
+    """
+    Create the single-row stats table and the triggers on snow and sap that keep it
+    up to date, so get_database_stats reads the counters in O(1).
+    The counters are computed once when the table is first created.
+    """
+    if stats_cache_enabled(conn):
+        return
 
-    cursor.execute("SELECT COUNT(*) FROM snow WHERE extraction_status = 'nothing_to_extract'")
-    nothing_to_extract_count = cursor.fetchone()[0]
+    cursor = conn.cursor()
+    columns = ',\n'.join(f"{column} INTEGER NOT NULL DEFAULT 0" for column in STATS_COLUMNS)
+    cursor.execute(f"CREATE TABLE stats (id INTEGER PRIMARY KEY CHECK (id = 1),\n{columns})")
+
+    insert_changes = ', '.join(f"{column} = {column} + {snow_stats_flag(column, 'NEW')}"
+                               for column in SNOW_STATS_CONDITIONS)
+    delete_changes = ', '.join(f"{column} = {column} - {snow_stats_flag(column, 'OLD')}"
+                               for column in SNOW_STATS_CONDITIONS)
+    update_changes = ', '.join(f"{column} = {column} - {snow_stats_flag(column, 'OLD')} + {snow_stats_flag(column, 'NEW')}"
+                               for column in SNOW_STATS_CONDITIONS if column != 'total_tickets')
+
+    cursor.execute(f"CREATE TRIGGER stats_snow_insert AFTER INSERT ON snow BEGIN UPDATE stats SET {insert_changes}; END")
+    cursor.execute(f"CREATE TRIGGER stats_snow_delete AFTER DELETE ON snow BEGIN UPDATE stats SET {delete_changes}; END")
+    cursor.execute(f"""
+        CREATE TRIGGER stats_snow_update AFTER UPDATE OF account_number, extraction_status ON snow
+        BEGIN UPDATE stats SET {update_changes}; END
+    """)
+    create_sap_stats_triggers(cursor)
+
+    counts = compute_stats(conn)
+    cursor.execute(f"INSERT INTO stats (id, {', '.join(STATS_COLUMNS)}) VALUES (1, {', '.join('?' for _ in STATS_COLUMNS)})",
+                   [counts[column] for column in STATS_COLUMNS])
+    conn.commit()
 
-    cursor.execute("SELECT COUNT(*) FROM snow WHERE extraction_status IS NULL OR extraction_status = ''")
-    pending_extraction_count = cursor.fetchone()[0]
+def disable_stats_cache(conn):
+    """Drop the stats table and its triggers"""
+    cursor = conn.cursor()
+    for trigger in ('stats_snow_insert', 'stats_snow_delete', 'stats_snow_update',
+                    'stats_sap_insert', 'stats_sap_delete'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute("DROP TABLE IF EXISTS stats")
+    conn.commit()
 
-    # SAP records
-    cursor.execute("SELECT COUNT(*) FROM sap")
-    sap_records = cursor.fetchone()[0]
+# Full-text index over snow.short_description and snow.text. It stores the ticket number
+# and is joined with snow on it (snow's implicit rowid can change with VACUUM), kept in
+# sync by triggers. The ticket column is indexed too so the triggers find a ticket's
+# row through the index; searches only look at description and text.
+# Prefix indexes keep short prefix searches such as 'Rech*' fast.
+SEARCH_INDEX_SQL = '''
+    CREATE VIRTUAL TABLE snow_fts USING fts5(
+        ticket, short_description, text,
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+'''
+
+# Removes OLD.ticket's row: found through the index as a phrase on the ticket column;
+# a ticket without letters or digits has no tokens and is looked for with a scan instead
+# (the GLOB test is constant per statement, so the scan only runs for such tickets)
+SEARCH_DELETE_SQL = '''
+            DELETE FROM snow_fts
+            WHERE rowid IN (SELECT rowid FROM snow_fts
+                            WHERE snow_fts MATCH 'ticket : "' || replace(OLD.ticket, '"', '""') || '"')
+            AND ticket = OLD.ticket;
+            DELETE FROM snow_fts
+            WHERE OLD.ticket NOT GLOB '*[A-Za-z0-9]*' AND ticket = OLD.ticket;'''
+
+SEARCH_INSERT_SQL = '''
+            INSERT INTO snow_fts (ticket, short_description, text)
+            VALUES (NEW.ticket, NEW.short_description, NEW.text);'''
+
+SEARCH_TRIGGERS = {
+    'search_snow_insert': f'''
+        AFTER INSERT ON snow BEGIN{SEARCH_INSERT_SQL}
+        END''',
+    'search_snow_delete': f'''
+        AFTER DELETE ON snow BEGIN{SEARCH_DELETE_SQL}
+        END''',
+    # Only when the indexed text actually changes (a reload rewrites every description)
+    'search_snow_update': f'''
+        AFTER UPDATE OF ticket, short_description, text ON snow
+        WHEN OLD.ticket IS NOT NEW.ticket OR OLD.short_description IS NOT NEW.short_description
+             OR OLD.text IS NOT NEW.text
+        BEGIN{SEARCH_DELETE_SQL}{SEARCH_INSERT_SQL}
+        END''',
+}
+
+# Search results per page
+SEARCH_PAGE_SIZE = 50
+
+# Searches with more hits than this are not ranked (ranking every hit of a very broad
+# search takes seconds) but listed most recently added or changed ticket first
+SEARCH_RANK_LIMIT = 10000
+
+def search_index_enabled(conn):
+    """True if the snow_fts full-text index exists"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'snow_fts'")
+    return cursor.fetchone() is not None
+
+def drop_search_index(conn):
+    """Drop the snow_fts full-text index and its triggers"""
+    cursor = conn.cursor()
+    for trigger in SEARCH_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute("DROP TABLE IF EXISTS snow_fts")
+    conn.commit()
+
+def create_search_index(conn):
+    """
+    Create the snow_fts full-text index and its triggers, indexing the existing tickets
+    once. An index of the earlier layout (keyed by snow's rowid) is replaced.
+    Prints a warning if this SQLite build has no FTS5.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'snow_fts'")
+    row = cursor.fetchone()
+    if row and "content='snow'" in row[0]:
+        drop_search_index(conn)
+    elif row:
+        return
+
+    try:
+        cursor.execute(SEARCH_INDEX_SQL)
+    except sqlite3.OperationalError as e:
+        print(f"Warning: full-text search is not available ({e})")
+        return
+
+    for name, body in SEARCH_TRIGGERS.items():
+        cursor.execute(f"CREATE TRIGGER {name} {body}")
+    rebuild_search_index(conn)
+
+def rebuild_search_index(conn):
+    """Re-index all tickets"""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM snow_fts")
+    cursor.execute("INSERT INTO snow_fts (ticket, short_description, text) SELECT ticket, short_description, text FROM snow")
+    conn.commit()
+
+def search_query(text):
+    """
+    FTS5 query matching tickets whose description or email text contains all words of
+    text. Each word is searched as a phrase (so '20-572883' or 'O'Brien' need no
+    escaping); a trailing * searches for the prefix.
+    """
+    terms = []
+    for word in text.split():
+        prefix = '*' if word.endswith('*') else ''
+        word = word.rstrip('*')
+        if any(char.isalnum() for char in word):
+            terms.append('"' + word.replace('"', '""') + '"' + prefix)
+    if not terms:
+        return ''
+    return '{short_description text} : (' + ' '.join(terms) + ')'
+
+def search_tickets(text, page=0, page_size=SEARCH_PAGE_SIZE, db_path=None):
+    """
+    Full-text search over ticket descriptions and extracted email text.
+    Returns (total, rows) for one page of results, best matches first (most recently
+    added or changed first for more than SEARCH_RANK_LIMIT hits); rows are
+    (ticket, short_description, account_number, account_name, extraction_status, snippet)
+    with the matched words in the snippet marked by [ ].
+    """
+    query = search_query(text)
+    if not query:
+        return 0, []
+
+    conn = get_connection(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM snow_fts WHERE snow_fts MATCH ?", (query,))
+    total = cursor.fetchone()[0]
+    order = 'rank' if total <= SEARCH_RANK_LIMIT else 'snow_fts.rowid DESC'
+
+    cursor.execute(f'''
+        SELECT s.ticket, s.short_description, s.account_number, s.account_name, s.extraction_status,
+               snippet(snow_fts, -1, '[', ']', '...', 12)
+        FROM snow_fts
+        JOIN snow s ON s.ticket = snow_fts.ticket
+        WHERE snow_fts MATCH ?
+        ORDER BY {order}
+        LIMIT ? OFFSET ?
+    ''', (query, page_size, page * page_size))
+    return total, cursor.fetchall()
+
+def get_database_stats(db_path=None, use_cache=True):
+    """
+    Get current database statistics.
+    Read from the trigger-maintained stats table when it exists (use_cache=True),
+    otherwise computed with one aggregate pass over snow.
+    """
+    conn = get_connection(db_path)
+    cursor = conn.cursor()
+
+    counts = None
+    if use_cache and stats_cache_enabled(conn):
+        cursor.execute(f"SELECT {', '.join(STATS_COLUMNS)} FROM stats WHERE id = 1")
+        row = cursor.fetchone()
+        if row:
+            counts = dict(zip(STATS_COLUMNS, row))
+    if counts is None:
+        counts = compute_stats(conn)
 
-    conn.close()
+    total_tickets = counts['total_tickets']
+    matched_tickets = counts['matched_tickets']
 
     return {
         'total_tickets': total_tickets,
         'matched_tickets': matched_tickets,
         'match_percentage': (matched_tickets / total_tickets * 100) if total_tickets > 0 else 0,
-        'extracted_count': extracted_count,
-        'nothing_to_extract_count': nothing_to_extract_count,
-        'pending_extraction_count': pending_extraction_count,
-        'sap_records': sap_records
+        'extracted_count': counts['extracted_count'],
+        'nothing_to_extract_count': counts['nothing_to_extract_count'],
+        'pending_extraction_count': counts['pending_extraction_count'],
+        'sap_records': counts['sap_records']
     }
 
 if __name__ == "__main__":
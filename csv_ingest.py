@@ -0,0 +1,84 @@
+"""
+Streaming CSV readers for the SAP and ServiceNow exports, built on the csv module.
+
+Rows are read one at a time and only the requested columns are kept, so memory use stays
+flat however large the export is, and loading data does not need pandas. Missing values
+follow pandas.read_csv(dtype=str): empty fields and pandas' default NA strings become None,
+so both readers produce the same rows.
+"""
+import csv
+from itertools import islice
+
+# UTF-8 with an optional byte order mark (Excel and SAP exports often start with one)
+CSV_ENCODING = 'utf-8-sig'
+
+# Strings pandas.read_csv treats as missing by default
+NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+
+
+def clean_header(name):
+    """Strip whitespace, quotes and byte order marks (also mis-decoded ones) from a header"""
+    return name.strip().replace('"', '').replace('ï»¿', '').replace('\ufeff', '')
+
+
+def open_csv(csv_file):
+    """Open a CSV export for reading with the csv module"""
+    return open(csv_file, newline='', encoding=CSV_ENCODING)
+
+
+def read_csv_header(csv_file):
+    """Cleaned column names of a CSV export (empty list for an empty file)"""
+    with open_csv(csv_file) as f:
+        header = next(csv.reader(f), [])
+    return [clean_header(name) for name in header]
+
+
+def iter_csv_rows(csv_file, columns):
+    """
+    Yield one tuple per data row with the values of columns, given as cleaned header
+    names or 0-based positions. Columns missing from the file or the row are None,
+    as are NA values. Blank lines are skipped.
+    """
+    with open_csv(csv_file) as f:
+        reader = csv.reader(f)
+        header = [clean_header(name) for name in next(reader, [])]
+
+        positions = []
+        for column in columns:
+            if isinstance(column, int):
+                positions.append(column if column < len(header) else None)
+            else:
+                positions.append(header.index(column) if column in header else None)
+
+        for record in reader:
+            if not record:
+                continue
+            length = len(record)
+            yield tuple(
+                None if position is None or position >= length or record[position] in NA_VALUES
+                else record[position]
+                for position in positions)
+
+
+def iter_chunks(rows, size):
+    """Group an iterable of rows into lists of at most size rows"""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_amount(value):
+    """Parse a number like pandas.to_numeric(errors='coerce'); None if it is not a number"""
+    if value is None or '_' in value or not value.isascii():
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return None if number != number else number
@@ -0,0 +1,72 @@
+"""
+Central SQLite connection manager for the GUI, the loader and the scraper.
+
+Connections are reused per thread and tuned for several processes working on the
+same database at once (WAL journal, busy timeout). The database path defaults to
+ticket_matching.db and can be set with the RNB_SNOW_DB environment variable or a
+db_path argument.
+"""
+import os
+import sqlite3
+import threading
+
+DEFAULT_DB_PATH = 'ticket_matching.db'
+
+# Environment variable that overrides the database path
+DB_PATH_ENV = 'RNB_SNOW_DB'
+
+# Seconds to wait for a lock held by another connection before "database is locked"
+BUSY_TIMEOUT = 30
+
+# Applied to every new connection
+CONNECTION_PRAGMAS = [
+    ('journal_mode', 'WAL'),       # readers and one writer run concurrently
+    ('synchronous', 'NORMAL'),     # safe with WAL, no fsync per commit
+    ('cache_size', -64000),        # 64 MB page cache
+    ('mmap_size', 268435456),      # 256 MB memory-mapped I/O
+    ('busy_timeout', BUSY_TIMEOUT * 1000),
+]
+
+_local = threading.local()
+
+
+def get_db_path(db_path=None):
+    """Resolve the database path: argument, then RNB_SNOW_DB, then ticket_matching.db"""
+    return db_path or os.environ.get(DB_PATH_ENV) or DEFAULT_DB_PATH
+
+
+def connect(db_path=None):
+    """Open a new tuned connection (not shared, the caller closes it)"""
+    conn = sqlite3.connect(get_db_path(db_path), timeout=BUSY_TIMEOUT)
+    for pragma, value in CONNECTION_PRAGMAS:
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    return conn
+
+
+def get_connection(db_path=None):
+    """Return this thread's connection to the database, opening it on first use"""
+    path = os.path.abspath(get_db_path(db_path))
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(path)
+    if conn is not None:
+        try:
+            conn.total_changes
+        except sqlite3.ProgrammingError:
+            # Closed by the caller, open a new one
+            conn = None
+
+    if conn is None:
+        conn = connect(path)
+        connections[path] = conn
+    return conn
+
+
+def close_connection(db_path=None):
+    """Close this thread's connection to the database (if open)"""
+    path = os.path.abspath(get_db_path(db_path))
+    conn = getattr(_local, 'connections', {}).pop(path, None)
+    if conn is not None:
+        conn.close()
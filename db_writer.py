@@ -0,0 +1,143 @@
+"""
+Single background writer for scraper results.
+
+Statements are queued by the extraction loop and executed by one thread in batches: a
+batch is committed once it holds batch_size statements or flush_interval seconds after
+its first statement, so there is one commit (fsync) per batch instead of per ticket and
+the database is locked only briefly. Closing the writer, also on Ctrl-C through the
+context manager, commits everything still queued.
+"""
+import queue
+import sqlite3
+import threading
+import time
+
+from db_connection import connect
+
+# Statements per commit
+BATCH_SIZE = 50
+
+# Seconds a queued statement waits at most before it is committed
+FLUSH_INTERVAL = 2.0
+
+_STOP = object()
+
+
+class BatchWriter:
+    """Queue of (sql, params) statements executed and committed in batches by one thread"""
+
+    def __init__(self, db_path=None, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.commits = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='BatchWriter', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def write(self, sql, params=()):
+        """Queue one statement"""
+        if not self._thread.is_alive():
+            raise RuntimeError("BatchWriter is not running")
+        self._queue.put((sql, params))
+
+    def close(self):
+        """Commit all queued statements and stop the writer thread"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _run(self):
+        conn = connect(self.db_path)
+        pending = []
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is _STOP:
+                    break
+                if item is not None:
+                    pending.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+
+                if pending and (len(pending) >= self.batch_size or time.monotonic() >= deadline):
+                    if self._commit(conn, pending):
+                        pending = []
+                        deadline = None
+                    else:
+                        # Keep the batch and retry after another interval
+                        deadline = time.monotonic() + self.flush_interval
+
+            if pending and not self._commit(conn, pending):
+                print(f"BatchWriter: {len(pending)} statements could not be written")
+        finally:
+            conn.close()
+
+    def _commit(self, conn, batch):
+        """
+        Execute a batch in one transaction (runs of the same statement with executemany).
+        Returns False if the database is locked, so the batch is retried later. On other
+        errors the statements are executed one by one and the failing ones are dropped.
+        """
+        try:
+            cursor = conn.cursor()
+            start = 0
+            while start < len(batch):
+                sql = batch[start][0]
+                end = start
+                while end < len(batch) and batch[end][0] == sql:
+                    end += 1
+                cursor.executemany(sql, [params for _, params in batch[start:end]])
+                start = end
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            if is_busy_error(e):
+                print(f"BatchWriter: database busy, retrying {len(batch)} statements: {e}")
+                return False
+            print(f"BatchWriter: error writing {len(batch)} statements, writing them one by one: {e}")
+            return self._commit_each(conn, batch)
+
+        self.written += len(batch)
+        self.commits += 1
+        return True
+
+    def _commit_each(self, conn, batch):
+        """Execute the statements of a failed batch one at a time, dropping the ones that fail"""
+        cursor = conn.cursor()
+        written = 0
+        for sql, params in batch:
+            try:
+                cursor.execute(sql, params)
+                written += 1
+            except Exception as e:
+                if is_busy_error(e):
+                    conn.rollback()
+                    return False
+                print(f"BatchWriter: dropped statement {params!r}: {e}")
+        conn.commit()
+
+        self.written += written
+        self.commits += 1
+        return True
+
+
+def is_busy_error(error):
+    """True for "database is locked/busy" errors, which go away when retried later"""
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in str(error) or 'busy' in str(error))
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Synthetic SAP open item and ServiceNow sc_req_item exports for benchmarks.
+
+Files have the same columns and formats as the real exports and are written row by row,
+so any size works (10k to 10M rows). Ticket descriptions reference the generated SAP data
+in every number format the matcher recognises (8 digits, 00-prefixed, XXX-XXXXX,
+XX-XXXXXX, 10-digit invoice numbers), plus unknown accounts in the valid ranges and
+descriptions without a number. The same seed always gives the same files.
+
+    python generate_test_data.py --sap-rows 1000000 --tickets 100000 --out bench_data
+"""
+import argparse
+import csv
+import os
+import random
+
+from account_matcher import VALID_ACCOUNT_RANGES
+
+# Column headers of the real exports
+SAP_HEADER = ['Document Number', 'Reference', 'Company Code Currency Value',
+              'Company Code Currency Key', 'Name', 'Customer']
+SNOW_HEADER = ['number', 'state', 'assigned_to', 'sys_created_on', 'sys_updated_on',
+               'short_description', 'u_sender_address', 'sys_updated_by', 'assignment_group']
+
+# Open items per customer on average
+ITEMS_PER_CUSTOMER = 20
+
+# Share of customers outside the valid account ranges
+OTHER_CUSTOMER_SHARE = 0.2
+
+FIRST_DOCUMENT_NUMBER = 1400000000
+FIRST_REFERENCE = 9000000000
+FIRST_TICKET = 17000000
+
+CURRENCIES = ['EUR'] * 8 + ['USD', 'GBP']
+
+NAME_WORDS = ['Autohaus', 'Mercedes', 'Truck', 'Service', 'Logistik', 'Transporte', 'Meyer',
+              'Schmidt', 'Müller', 'Lekkerland', 'Nutzfahrzeuge', 'Spedition', 'Bau', 'Handel']
+NAME_SUFFIXES = ['GmbH', 'AG', 'SE', 'KG', 'GmbH & Co. KG', 'S.A.', 'Ltd', 'B.V.']
+
+# Description templates by number format ({} is the formatted number), with weights
+DESCRIPTION_FORMATS = [
+    ('customer', 30, ['GS auf Kto {} Kunde {name}', 'Auszahlung Konto {}', 'Kunde {} Zahlungsavis',
+                      'Gutschrift {} bitte ausgleichen', 'Account {} payment advice']),
+    ('customer_00', 10, ['Kontoauszug {}', 'Debitor {} Rückfrage', 'Customer {} statement']),
+    ('dash_3_5', 8, ['Kto. {} Zahlung', 'Verrechnung {} {name}', 'Konto {} Mahnung']),
+    ('dash_2_6', 8, ['Kd-Nr. {} Avis', 'Zahlung Kunde {}', 'Kunde {} Anfrage']),
+    ('invoice', 8, ['Rechnung {} Rückfrage', 'Invoice {} dispute', 'RE {} Zahlung erfolgt']),
+    ('reference', 6, ['Ihre Referenz {}', 'Reference {} payment', 'Beleg {} Kopie']),
+    ('valid_range', 5, ['Neukunde {} Konto anlegen', 'Zahlung {} unbekannt']),
+    ('none', 25, ['Rechnung Mercedes 17.09.25.pdf', 'Zahlungsavis', 'WG: Anfrage Kontoauszug',
+                  'Mahnung', 'Bitte um Rückruf', 'Payment advice', 'AW: Gutschrift']),
+]
+
+SENDER_DOMAINS = ['daimlertruck.com', 'gmx.net', 'web.de', 'lekkerland.de', 'gmail.com',
+                  'logistik-meyer.de', 'autohaus-schmidt.de']
+
+
+def generate_customers(count, rng):
+    """count distinct 8-digit customer numbers, mostly inside the valid account ranges"""
+    customers = set()
+    while len(customers) < count:
+        if rng.random() < OTHER_CUSTOMER_SHARE:
+            # Outside the valid ranges, with leading zeros as in the real export
+            number = rng.randint(1000000, 19999999)
+        else:
+            low, high = rng.choice(VALID_ACCOUNT_RANGES)
+            number = rng.randint(low, high)
+        customers.add(f"{number:08d}")
+    customers = sorted(customers)
+    rng.shuffle(customers)
+    return customers
+
+
+def customer_name(rng):
+    return f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)} {rng.choice(NAME_SUFFIXES)}".upper()
+
+
+def sap_item(row, customers):
+    """Document number, reference and customer of SAP row number row (deterministic)"""
+    document_number = FIRST_DOCUMENT_NUMBER + row
+    reference = FIRST_REFERENCE + (row * 7919) % 999999999
+    return str(document_number), str(reference), customers[row % len(customers)]
+
+
+def write_sap_file(path, rows, customers, seed=0):
+    """Write an SAP open item export with rows items spread over customers"""
+    rng = random.Random(seed)
+    names = {}
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(SAP_HEADER)
+        for row in range(rows):
+            document_number, reference, customer = sap_item(row, customers)
+            if customer not in names:
+                names[customer] = customer_name(rng)
+            amount = rng.uniform(-5000, 20000)
+            writer.writerow([document_number, reference, f"{amount:.2f}", rng.choice(CURRENCIES),
+                             names[customer], customer])
+    return names
+
+
+def format_number(kind, sap_rows, customers, rng):
+    """A number in the given format, referencing the generated SAP data"""
+    if kind == 'customer':
+        return rng.choice(customers)
+    if kind == 'customer_00':
+        return '00' + rng.choice(customers)
+    if kind == 'dash_3_5':
+        customer = rng.choice(customers)
+        return f"{customer[:3]}-{customer[3:]}"
+    if kind == 'dash_2_6':
+        customer = rng.choice(customers)
+        return f"{customer[:2]}-{customer[2:]}"
+    if kind in ('invoice', 'reference'):
+        document_number, reference, _ = sap_item(rng.randrange(sap_rows), customers)
+        return document_number if kind == 'invoice' else reference
+    if kind == 'valid_range':
+        low, high = rng.choice(VALID_ACCOUNT_RANGES)
+        return str(rng.randint(low, high))
+    return ''
+
+
+def write_snow_file(path, tickets, sap_rows, customers, names=None, seed=0):
+    """Write a ServiceNow sc_req_item export with tickets rows"""
+    rng = random.Random(seed + 1)
+    kinds = [kind for kind, _, _ in DESCRIPTION_FORMATS]
+    weights = [weight for _, weight, _ in DESCRIPTION_FORMATS]
+    templates = {kind: texts for kind, _, texts in DESCRIPTION_FORMATS}
+    names = names or {}
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(SNOW_HEADER)
+        for row in range(tickets):
+            kind = rng.choices(kinds, weights)[0]
+            number = format_number(kind, sap_rows, customers, rng)
+            name = names.get(rng.choice(customers), 'Kunde').title()
+            description = rng.choice(templates[kind]).format(number, name=name)
+
+            day = 1 + row % 28
+            created = f"2025-09-{day:02d} {rng.randint(7, 18):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+            sender = f"{rng.choice(NAME_WORDS).lower()}.{row % 1000}@{rng.choice(SENDER_DOMAINS)}"
+            writer.writerow([f"RITM{FIRST_TICKET + row}", 'Open', '', created, created, description,
+                             sender, 'integration_di@css', 'DTAG_R&B Accounts Receivable'])
+
+
+def generate_test_data(out_dir, sap_rows, tickets, seed=0):
+    """Write sap.csv and sc_req_item.csv to out_dir. Returns their paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    customers = generate_customers(max(1, sap_rows // ITEMS_PER_CUSTOMER), rng)
+
+    sap_file = os.path.join(out_dir, 'sap.csv')
+    snow_file = os.path.join(out_dir, 'sc_req_item.csv')
+    names = write_sap_file(sap_file, sap_rows, customers, seed)
+    write_snow_file(snow_file, tickets, sap_rows, customers, names, seed)
+    return sap_file, snow_file
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic SAP and ServiceNow exports")
+    parser.add_argument('--sap-rows', type=int, default=100000, help="SAP open items (default: 100000)")
+    parser.add_argument('--tickets', type=int, default=10000, help="ServiceNow tickets (default: 10000)")
+    parser.add_argument('--out', default='bench_data', help="output directory (default: bench_data)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed (default: 0)")
+    args = parser.parse_args(argv)
+
+    sap_file, snow_file = generate_test_data(args.out, args.sap_rows, args.tickets, args.seed)
+    print(f"Wrote {args.sap_rows} SAP items to {sap_file}")
+    print(f"Wrote {args.tickets} tickets to {snow_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,86 @@
+import time
+
+# Start of the startup clock, before any other import
+STARTUP_START = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import threading
 import subprocess
 import os
 import sys
-import sqlite3
-import csv
-from create_database import update_database, get_database_stats
+import json
+import multiprocessing
+
+# create_database (matching, CSV loading) is imported on first use, not at startup
+
+# Environment variable naming a file that startup timings are appended to (one JSON line per start)
+STARTUP_METRICS_ENV = 'RNB_SNOW_STARTUP_METRICS'
+
+
+class StartupTimer:
+    """Seconds from process start to each startup phase (imports, UI built, first window, stats)"""
+
+    def __init__(self, start=STARTUP_START):
+        self.start = start
+        self.phases = {}
+
+    def mark(self, phase):
+        self.phases[phase] = time.perf_counter() - self.start
+
+    def summary(self):
+        return "Startup: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases.items())
+
+    def save(self):
+        """Append the timings to the RNB_SNOW_STARTUP_METRICS file, if set"""
+        path = os.environ.get(STARTUP_METRICS_ENV)
+        if path:
+            with open(path, 'a', encoding='utf-8') as f:
+                record = {'time': time.time()}
+                record.update((phase, round(seconds, 4)) for phase, seconds in self.phases.items())
+                f.write(json.dumps(record) + "\n")
 
 
 class TicketMatchingGUI:
-    def __init__(self, root):
+    def __init__(self, root, startup_timer=None):
         self.root = root
+        self.startup_timer = startup_timer
         self.root.title("RnB Snow Ticket Matching System")
-        self.root.geometry("800x700")
+        self.root.geometry("900x850")
 
         # Variables
         self.sap_file = tk.StringVar()
         self.snow_file = tk.StringVar()
         self.status_text = tk.StringVar(value="Ready")
+        self.force_rematch = tk.BooleanVar(value=False)
+        self.differential_sap = tk.BooleanVar(value=False)
+        self._stats_thread = None
+
+        # Long-lived scraper (watch-mode process or in-process session) reused across launches
+        self.selenium_process = None
+        self.selenium_session = None
+        self._selenium_thread = None
+
+        # Full-text search: current query and page
+        self.search_text = tk.StringVar()
+        self.search_page = 0
+        self.search_total = 0
+        self._search_query = ''
 
         self.setup_ui()
+        if self.startup_timer:
+            self.startup_timer.mark('ui')
+            self.root.bind('<Map>', self._on_first_map, add='+')
+
+        # Stats are loaded in the background and filled in when ready
         self.refresh_stats()
 
+    def _on_first_map(self, event):
+        """Record time-to-first-window when the main window is first shown"""
+        if event.widget is self.root and 'first_window' not in self.startup_timer.phases:
+            self.startup_timer.mark('first_window')
+            self._report_startup()
+
     def setup_ui(self):
         # Main frame
         main_frame = ttk.Frame(self.root, padding="10")
@@ -65,6 +123,12 @@ class TicketMatchingGUI:
                                     command=self.export_to_csv)
         self.export_btn.pack(side=tk.LEFT, padx=5)
 
+        ttk.Checkbutton(process_frame, text="Force full rematch",
+                       variable=self.force_rematch).pack(side=tk.LEFT, padx=5)
+
+        ttk.Checkbutton(process_frame, text="Differential SAP reload",
+                       variable=self.differential_sap).pack(side=tk.LEFT, padx=5)
+
         # Progress bar
         self.progress = ttk.Progressbar(main_frame, mode='indeterminate')
         self.progress.grid(row=3, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
@@ -95,22 +159,58 @@ class TicketMatchingGUI:
 
         for label_text, key, row, col in stats_layout:
             ttk.Label(stats_frame, text=label_text).grid(row=row, column=col, sticky=tk.W, padx=5, pady=2)
-            self.stats_labels[key] = ttk.Label(stats_frame, text="0", font=("Arial", 10, "bold"))
+            self.stats_labels[key] = ttk.Label(stats_frame, text="...", font=("Arial", 10, "bold"))
             self.stats_labels[key].grid(row=row, column=col+1, sticky=tk.W, padx=5, pady=2)
 
         # Refresh button
         ttk.Button(stats_frame, text="Refresh Stats",
                   command=self.refresh_stats).grid(row=4, column=0, columnspan=4, pady=10)
 
+        # Search section
+        search_frame = ttk.LabelFrame(main_frame, text="Search Tickets", padding="10")
+        search_frame.grid(row=6, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
+
+        search_bar = ttk.Frame(search_frame)
+        search_bar.pack(fill=tk.X)
+        search_entry = ttk.Entry(search_bar, textvariable=self.search_text, width=50)
+        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        search_entry.bind('<Return>', lambda event: self.search_tickets())
+        ttk.Button(search_bar, text="Search", command=self.search_tickets).pack(side=tk.LEFT, padx=5)
+        self.search_prev_btn = ttk.Button(search_bar, text="< Prev", state="disabled",
+                                          command=lambda: self._load_search_page(self.search_page - 1))
+        self.search_prev_btn.pack(side=tk.LEFT, padx=5)
+        self.search_next_btn = ttk.Button(search_bar, text="Next >", state="disabled",
+                                          command=lambda: self._load_search_page(self.search_page + 1))
+        self.search_next_btn.pack(side=tk.LEFT, padx=5)
+        self.search_status = ttk.Label(search_bar, text="")
+        self.search_status.pack(side=tk.LEFT, padx=5)
+
+        # Results table with scrollbar
+        results_frame = ttk.Frame(search_frame)
+        results_frame.pack(fill=tk.BOTH, expand=True, pady=(5, 0))
+
+        search_columns = [("ticket", "Ticket", 110), ("account_number", "Account", 90),
+                          ("account_name", "Account Name", 160), ("snippet", "Match", 440)]
+        self.search_results = ttk.Treeview(results_frame, columns=[column for column, _, _ in search_columns],
+                                           show="headings", height=8)
+        for column, heading, width in search_columns:
+            self.search_results.heading(column, text=heading)
+            self.search_results.column(column, width=width, stretch=(column == "snippet"))
+        results_scrollbar = ttk.Scrollbar(results_frame, orient=tk.VERTICAL, command=self.search_results.yview)
+        self.search_results.configure(yscrollcommand=results_scrollbar.set)
+
+        self.search_results.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        results_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
         # Log section
         log_frame = ttk.LabelFrame(main_frame, text="Processing Log", padding="10")
-        log_frame.grid(row=6, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=10)
+        log_frame.grid(row=7, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=10)
 
         # Text widget with scrollbar
         text_frame = ttk.Frame(log_frame)
         text_frame.pack(fill=tk.BOTH, expand=True)
 
-        self.log_text = tk.Text(text_frame, height=15, width=80)
+        self.log_text = tk.Text(text_frame, height=10, width=80)
         scrollbar = ttk.Scrollbar(text_frame, orient=tk.VERTICAL, command=self.log_text.yview)
         self.log_text.configure(yscrollcommand=scrollbar.set)
 
@@ -125,7 +225,7 @@ class TicketMatchingGUI:
         self.root.columnconfigure(0, weight=1)
         self.root.rowconfigure(0, weight=1)
         main_frame.columnconfigure(1, weight=1)
-        main_frame.rowconfigure(6, weight=1)
+        main_frame.rowconfigure(7, weight=1)
 
     def browse_sap_file(self):
         filename = filedialog.askopenfilename(
@@ -181,11 +281,13 @@ class TicketMatchingGUI:
         self.progress.start()
 
         # Run processing in background thread
-        thread = threading.Thread(target=self._process_files_thread, args=(sap_file, snow_file))
+        thread = threading.Thread(target=self._process_files_thread,
+                                  args=(sap_file, snow_file, self.force_rematch.get(),
+                                        self.differential_sap.get()))
         thread.daemon = True
         thread.start()
 
-    def _process_files_thread(self, sap_file, snow_file):
+    def _process_files_thread(self, sap_file, snow_file, force_rematch=False, differential_sap=False):
         """Background thread for file processing"""
         try:
             def progress_callback(message):
@@ -193,14 +295,18 @@ class TicketMatchingGUI:
 
             self.root.after(0, self.update_status, "Starting file processing...")
 
+            from create_database import update_database
+
             # Process files
             matched = update_database(
                 sap_file=sap_file,
                 snow_file=snow_file,
-                progress_callback=progress_callback
+                progress_callback=progress_callback,
+                force_rematch=force_rematch,
+                differential_sap=differential_sap
             )
 
-            self.root.after(0, self.update_status, f"Processing complete! {matched} matches found")
+            self.root.after(0, self.update_status, f"Processing complete! {matched} tickets matched")
             self.root.after(0, self.refresh_stats)
 
         except Exception as e:
@@ -218,32 +324,124 @@ class TicketMatchingGUI:
         self.progress.stop()
 
     def refresh_stats(self):
-        """Refresh database statistics"""
+        """Refresh database statistics in a background thread (labels are filled in when ready)"""
+        if self._stats_thread is not None and self._stats_thread.is_alive():
+            return
+
+        self._stats_thread = threading.Thread(target=self._refresh_stats_thread)
+        self._stats_thread.daemon = True
+        self._stats_thread.start()
+
+    def _refresh_stats_thread(self):
+        """Background thread for loading statistics"""
         try:
+            from create_database import get_database_stats
+
             stats = get_database_stats()
+            self.root.after(0, self._show_stats, stats)
+        except Exception as e:
+            self.root.after(0, self._show_stats_error, e)
+
+    def _show_stats(self, stats):
+        """Fill in the statistics labels (Tk thread)"""
+        self.stats_labels['total_tickets'].config(text=str(stats['total_tickets']))
+        self.stats_labels['matched_tickets'].config(text=str(stats['matched_tickets']))
+        self.stats_labels['match_percentage'].config(text=f"{stats['match_percentage']:.1f}%")
+        self.stats_labels['sap_records'].config(text=str(stats['sap_records']))
+        self.stats_labels['extracted_count'].config(text=str(stats['extracted_count']))
+        self.stats_labels['nothing_to_extract_count'].config(text=str(stats['nothing_to_extract_count']))
+        self.stats_labels['pending_extraction_count'].config(text=str(stats['pending_extraction_count']))
+
+        self.log_message("Statistics refreshed")
+        self._stats_loaded()
+
+    def _show_stats_error(self, error):
+        self.log_message(f"Error refreshing stats: {error}")
+        self._stats_loaded()
+
+    def _stats_loaded(self):
+        if self.startup_timer and 'stats' not in self.startup_timer.phases:
+            self.startup_timer.mark('stats')
+            self._report_startup()
+
+    def _report_startup(self):
+        """Report the startup timings once the window is shown and the first stats are loaded"""
+        phases = self.startup_timer.phases
+        if 'first_window' in phases and 'stats' in phases:
+            summary = self.startup_timer.summary()
+            print(summary)
+            self.log_message(summary)
+            try:
+                self.startup_timer.save()
+            except OSError as e:
+                self.log_message(f"Could not save startup timings: {e}")
+
+    def search_tickets(self):
+        """Search ticket descriptions and email text for the words in the search box"""
+        self._search_query = self.search_text.get().strip()
+        self._load_search_page(0)
+
+    def _load_search_page(self, page):
+        """Load one page of search results in a background thread"""
+        if not self._search_query:
+            return
+        self.search_status.config(text="Searching...")
 
-            self.stats_labels['total_tickets'].config(text=str(stats['total_tickets']))
-            self.stats_labels['matched_tickets'].config(text=str(stats['matched_tickets']))
-            self.stats_labels['match_percentage'].config(text=f"{stats['match_percentage']:.1f}%")
-            self.stats_labels['sap_records'].config(text=str(stats['sap_records']))
-            self.stats_labels['extracted_count'].config(text=str(stats['extracted_count']))
-            self.stats_labels['nothing_to_extract_count'].config(text=str(stats['nothing_to_extract_count']))
-            self.stats_labels['pending_extraction_count'].config(text=str(stats['pending_extraction_count']))
+        thread = threading.Thread(target=self._search_thread, args=(self._search_query, page))
+        thread.daemon = True
+        thread.start()
 
-            self.log_message("Statistics refreshed")
+    def _search_thread(self, query, page):
+        """Background thread for the search"""
+        try:
+            from create_database import search_tickets
 
+            total, rows = search_tickets(query, page=page)
+            self.root.after(0, self._show_search_results, query, page, total, rows)
         except Exception as e:
-            self.log_message(f"Error refreshing stats: {e}")
+            error_msg = f"Search error: {str(e)}"
+            self.root.after(0, self.search_status.config, {'text': error_msg})
+            self.root.after(0, self.log_message, error_msg)
+
+    def _show_search_results(self, query, page, total, rows):
+        if query != self._search_query:
+            return  # A newer search was started
+        from create_database import SEARCH_PAGE_SIZE
+
+        self.search_page = page
+        self.search_total = total
+        self.search_results.delete(*self.search_results.get_children())
+        for ticket, short_description, account_number, account_name, extraction_status, snippet in rows:
+            self.search_results.insert('', tk.END, values=(ticket, account_number or '', account_name or '',
+                                                           ' '.join((snippet or '').split())))
+
+        first = page * SEARCH_PAGE_SIZE
+        if total:
+            self.search_status.config(text=f"{first + 1}-{first + len(rows)} of {total}")
+        else:
+            self.search_status.config(text="No tickets found")
+        self.search_prev_btn.config(state="normal" if page > 0 else "disabled")
+        self.search_next_btn.config(state="normal" if first + len(rows) < total else "disabled")
 
     def launch_selenium(self):
         """Launch selenium debug session"""
         try:
+            from create_database import get_database_stats
+
             # Check if there are tickets to process
             stats = get_database_stats()
             if stats['pending_extraction_count'] == 0:
                 messagebox.showinfo("Info", "No tickets pending extraction. All tickets have been processed or marked as 'nothing to extract'.")
                 return
 
+            if self.selenium_process is not None and self.selenium_process.poll() is None:
+                self.log_message(f"Selenium session is still running and will pick up the "
+                                 f"{stats['pending_extraction_count']} pending tickets")
+                return
+            if self._selenium_thread is not None and self._selenium_thread.is_alive():
+                self.log_message("Selenium session is still extracting, new tickets are picked up next round")
+                return
+
             self.log_message(f"Launching Selenium session for {stats['pending_extraction_count']} pending tickets...")
 
             # Determine the selenium executable path
@@ -262,7 +460,7 @@ class TicketMatchingGUI:
                     selenium_exe = os.path.join(os.getcwd(), 'RnB-Snow-Selenium.exe')
 
                 if os.path.exists(selenium_exe):
-                    cmd = [selenium_exe]
+                    cmd = [selenium_exe, '--watch']
                     self.log_message(f"Found Selenium executable at: {selenium_exe}")
                 else:
                     # Fallback: try to import and run directly
@@ -272,7 +470,7 @@ class TicketMatchingGUI:
             else:
                 # Running from source - use Python
                 current_dir = os.path.dirname(os.path.abspath(__file__))
-                cmd = ['python', 'selenium_debug_session.py']
+                cmd = ['python', 'selenium_debug_session.py', '--watch']
 
             # Launch selenium process
             if getattr(sys, 'frozen', False):
@@ -282,7 +480,8 @@ class TicketMatchingGUI:
                 # When running from source, use the script directory
                 work_dir = current_dir
 
-            process = subprocess.Popen(cmd, cwd=work_dir,
+            # Watch mode keeps the logged-in browser open for the tickets loaded next
+            self.selenium_process = subprocess.Popen(cmd, cwd=work_dir,
                                      creationflags=subprocess.CREATE_NEW_CONSOLE if os.name == 'nt' else 0)
 
             self.log_message("Selenium session launched in separate process")
@@ -296,15 +495,17 @@ class TicketMatchingGUI:
             messagebox.showerror("Error", error_msg)
 
     def _run_selenium_direct(self):
-        """Run selenium session directly in current process as fallback"""
+        """
+        Run selenium session directly in current process as fallback.
+        The logged-in browser is kept and reused for the next launch.
+        """
         try:
-            import selenium_debug_session
             self.log_message("Running Selenium session directly...")
 
             # Run in background thread to avoid blocking GUI
-            thread = threading.Thread(target=selenium_debug_session.main)
-            thread.daemon = True
-            thread.start()
+            self._selenium_thread = threading.Thread(target=self._run_selenium_batch)
+            self._selenium_thread.daemon = True
+            self._selenium_thread.start()
 
             messagebox.showinfo("Selenium Started", "Selenium session started in background thread.")
         except Exception as e:
@@ -312,8 +513,21 @@ class TicketMatchingGUI:
             self.log_message(error_msg)
             messagebox.showerror("Error", error_msg)
 
+    def _run_selenium_batch(self):
+        """Extract the pending tickets with the in-process session, logging in only once"""
+        try:
+            import selenium_debug_session
+
+            if self.selenium_session is None or not self.selenium_session.is_alive():
+                self.selenium_session = selenium_debug_session.ScraperSession().start()
+            self.selenium_session.run_batch()
+            self.root.after(0, self.refresh_stats)
+        except Exception as e:
+            error_msg = f"Error in Selenium session: {str(e)}"
+            self.root.after(0, self.log_message, error_msg)
+
     def export_to_csv(self):
-        """Export tickets from the current CSV file to a new CSV with all database columns"""
+        """Export tickets from the current CSV file to a new CSV (or .csv.gz / .parquet) file"""
         snow_file = self.snow_file.get().strip()
 
         if not snow_file:
@@ -324,84 +538,67 @@ class TicketMatchingGUI:
             messagebox.showerror("Error", f"ServiceNow file not found: {snow_file}")
             return
 
-        try:
-            # Ask user where to save the CSV file
-            export_file = filedialog.asksaveasfilename(
-                title="Save CSV Report",
-                defaultextension=".csv",
-                filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
-            )
+        # Ask user where to save the CSV file
+        export_file = filedialog.asksaveasfilename(
+            title="Save CSV Report",
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("Compressed CSV files", "*.csv.gz"),
+                       ("Parquet files", "*.parquet"), ("All files", "*.*")]
+        )
+
+        if not export_file:
+            return  # User cancelled
 
-            if not export_file:
-                return  # User cancelled
+        self.log_message("Starting CSV export...")
+        self.export_btn.config(state="disabled")
+        self.progress.config(mode='determinate', value=0)
 
-            self.log_message("Starting CSV export...")
+        # Export in background thread to avoid blocking GUI
+        thread = threading.Thread(target=self._export_thread, args=(snow_file, export_file))
+        thread.daemon = True
+        thread.start()
 
-            # Read the CSV file to get ticket numbers using basic file reading
-            ticket_numbers = []
-            with open(snow_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
+    def _export_thread(self, snow_file, export_file):
+        """Background thread for the export"""
+        try:
+            from report_export import export_tickets
 
-                # Get ticket column name (handle different formats)
-                if 'number' in reader.fieldnames:
-                    ticket_column = 'number'
-                elif 'ticket' in reader.fieldnames:
-                    ticket_column = 'ticket'
-                else:
-                    # Try first column
-                    ticket_column = reader.fieldnames[0]
-
-                for row in reader:
-                    if ticket_column in row and row[ticket_column]:
-                        ticket_numbers.append(row[ticket_column])
-
-            self.log_message(f"Found {len(ticket_numbers)} tickets in CSV file")
-
-            # Connect to database and get matching records
-            conn = sqlite3.connect('ticket_matching.db')
-            cursor = conn.cursor()
-
-            # Create placeholders for SQL IN clause
-            placeholders = ','.join(['?' for _ in ticket_numbers])
-            query = f'''
-                SELECT ticket, short_description, eml_domain, account_number, account_name, extraction_status
-                FROM snow
-                WHERE ticket IN ({placeholders})
-                ORDER BY ticket
-            '''
-
-            # Execute query
-            cursor.execute(query, ticket_numbers)
-            results = cursor.fetchall()
-            conn.close()
-
-            # Write to CSV file
-            with open(export_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-
-                # Write header
-                headers = ['ticket', 'short_description', 'eml_domain', 'account_number', 'account_name', 'extraction_status']
-                writer.writerow(headers)
-
-                # Write data rows
-                for row in results:
-                    # Convert None values to empty strings for better CSV display
-                    clean_row = ['' if cell is None else str(cell) for cell in row]
-                    writer.writerow(clean_row)
-
-            self.log_message(f"CSV export completed: {len(results)} tickets exported to {export_file}")
-            messagebox.showinfo("Export Complete",
-                               f"Successfully exported {len(results)} tickets to:\n{export_file}")
+            def progress_callback(done, total):
+                self.root.after(0, self._show_export_progress, done, total)
+
+            exported = export_tickets(snow_file, export_file, progress_callback=progress_callback)
+
+            self.root.after(0, self.update_status,
+                            f"CSV export completed: {exported} tickets exported to {export_file}")
+            self.root.after(0, messagebox.showinfo, "Export Complete",
+                            f"Successfully exported {exported} tickets to:\n{export_file}")
 
         except Exception as e:
             error_msg = f"Error exporting to CSV: {str(e)}"
-            self.log_message(error_msg)
-            messagebox.showerror("Export Error", error_msg)
+            self.root.after(0, self.update_status, error_msg)
+            self.root.after(0, messagebox.showerror, "Export Error", error_msg)
+
+        finally:
+            self.root.after(0, self._export_complete)
+
+    def _show_export_progress(self, done, total):
+        self.progress.config(maximum=max(total, 1), value=done)
+        self.status_text.set(f"Exporting... {done}/{total} tickets")
+
+    def _export_complete(self):
+        self.export_btn.config(state="normal")
+        self.progress.config(mode='indeterminate', value=0)
 
 
 def main():
+    # Needed for the parallel matching worker processes in the PyInstaller executable
+    multiprocessing.freeze_support()
+
+    startup_timer = StartupTimer()
+    startup_timer.mark('imports')
+
     root = tk.Tk()
-    app = TicketMatchingGUI(root)
+    app = TicketMatchingGUI(root, startup_timer)
     root.mainloop()
 
 
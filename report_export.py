@@ -0,0 +1,144 @@
+"""
+Export of the matching results for the tickets of a ServiceNow CSV file.
+
+The ticket numbers are loaded into a temporary table and joined with snow, so any number
+of tickets works (no SQLite host-parameter limit), and the result is streamed to the
+output file in chunks instead of being read into memory at once. Output can be CSV,
+gzip-compressed CSV or Parquet (needs pyarrow).
+"""
+import csv
+import gzip
+
+from csv_ingest import read_csv_header, iter_csv_rows, iter_chunks
+from db_connection import connect
+
+# Columns of the export, in order
+EXPORT_COLUMNS = ['ticket', 'short_description', 'eml_domain', 'account_number', 'account_name', 'extraction_status']
+
+# Output formats by file name ending (checked in order)
+EXPORT_FORMATS = {'.csv.gz': 'csv.gz', '.parquet': 'parquet', '.csv': 'csv'}
+
+# Rows read from the database and written per chunk
+EXPORT_CHUNK_SIZE = 5000
+
+
+def export_format(export_file):
+    """Output format for a file name: csv.gz, parquet or csv (the default)"""
+    name = export_file.lower()
+    for ending, fmt in EXPORT_FORMATS.items():
+        if name.endswith(ending):
+            return fmt
+    return 'csv'
+
+
+def ticket_column(snow_file):
+    """Ticket number column of a ServiceNow CSV: number, ticket or else the first column"""
+    header = read_csv_header(snow_file)
+    if 'number' in header:
+        return 'number'
+    if 'ticket' in header:
+        return 'ticket'
+    return 0
+
+
+def iter_ticket_numbers(snow_file):
+    """Yield the ticket numbers of a ServiceNow CSV, skipping empty ones"""
+    for ticket, in iter_csv_rows(snow_file, [ticket_column(snow_file)]):
+        if ticket:
+            yield ticket
+
+
+class CsvExportWriter:
+    """Writes chunks of rows to a (optionally gzip-compressed) CSV file"""
+
+    def __init__(self, export_file, compress=False):
+        if compress:
+            self.file = gzip.open(export_file, 'wt', newline='', encoding='utf-8')
+        else:
+            self.file = open(export_file, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, rows):
+        # None as empty strings for better CSV display
+        self.writer.writerows(['' if cell is None else str(cell) for cell in row] for row in rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetExportWriter:
+    """Writes chunks of rows as row groups of a Parquet file (all columns as strings)"""
+
+    def __init__(self, export_file):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet export needs pyarrow (pip install pyarrow)")
+
+        self.pa = pa
+        self.schema = pa.schema([(column, pa.string()) for column in EXPORT_COLUMNS])
+        self.writer = pq.ParquetWriter(export_file, self.schema)
+
+    def write(self, rows):
+        columns = [[None if cell is None else str(cell) for cell in column] for column in zip(*rows)]
+        self.writer.write_table(self.pa.Table.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def open_export_writer(export_file, fmt=None):
+    fmt = fmt or export_format(export_file)
+    if fmt == 'parquet':
+        return ParquetExportWriter(export_file)
+    if fmt in ('csv', 'csv.gz'):
+        return CsvExportWriter(export_file, compress=fmt == 'csv.gz')
+    raise ValueError(f"Unknown export format {fmt!r}, expected one of {tuple(EXPORT_FORMATS.values())}")
+
+
+def export_tickets(snow_file, export_file, fmt=None, progress_callback=None,
+                   chunk_size=EXPORT_CHUNK_SIZE, db_path=None):
+    """
+    Export the database rows of the tickets in snow_file to export_file, ordered by
+    ticket. progress_callback(done, total) is called after each chunk.
+    Returns the number of tickets exported.
+    """
+    # Own connection: the temporary table is private to it and dropped when it closes
+    conn = connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("CREATE TEMP TABLE export_tickets (ticket TEXT PRIMARY KEY)")
+        for chunk in iter_chunks(((ticket,) for ticket in iter_ticket_numbers(snow_file)), chunk_size):
+            cursor.executemany("INSERT OR IGNORE INTO export_tickets (ticket) VALUES (?)", chunk)
+
+        cursor.execute("SELECT COUNT(*) FROM export_tickets e JOIN snow s ON s.ticket = e.ticket")
+        total = cursor.fetchone()[0]
+
+        select_columns = ', '.join(f's.{column}' for column in EXPORT_COLUMNS)
+        cursor.execute(f'''
+            SELECT {select_columns}
+            FROM export_tickets e
+            JOIN snow s ON s.ticket = e.ticket
+            ORDER BY s.ticket
+        ''')
+
+        writer = open_export_writer(export_file, fmt)
+        done = 0
+        try:
+            if progress_callback:
+                progress_callback(done, total)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                writer.write(rows)
+                done += len(rows)
+                if progress_callback:
+                    progress_callback(done, total)
+        finally:
+            writer.close()
+        return done
+    finally:
+        conn.close()
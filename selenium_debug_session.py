@@ -3,21 +3,195 @@ import os
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # Suppress TensorFlow logging
 os.environ['PYTHONWARNINGS'] = 'ignore::DeprecationWarning'  # Suppress deprecation warnings
 
-import sqlite3
 import time
-import pdb
+import queue
+import argparse
+import json
+import shutil
+import socket
+import tempfile
+import threading
+from urllib.parse import urlparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-import re
+from selenium.common.exceptions import TimeoutException
+from db_connection import get_connection
+from create_database import create_database, get_sap_generation
+from account_index import get_account_index
+from account_matcher import find_matches, account_from_match
+from servicenow_api import TableApiClient
+from db_writer import BatchWriter
+from work_queue import ExtractionQueue, CLAIM_BATCH_SIZE
+
+# ServiceNow instance; RNB_SNOW_URL points the scraper elsewhere (e.g. a local stub server)
+SERVICENOW_URL_ENV = 'RNB_SNOW_URL'
+DEFAULT_SERVICENOW_URL = 'https://emeops03.service-now.com'
+
+# Extraction backends: 'browser' renders the ticket and email pages, 'http' reads the same
+# records over the REST Table API with the browser's session (the browser is only used to log in)
+BACKEND_ENV = 'RNB_SNOW_BACKEND'
+EXTRACTION_BACKENDS = ('browser', 'http')
+
+# Number of browser windows (or parallel Table API requests) extracting tickets at the same time
+WORKERS_ENV = 'RNB_SNOW_WORKERS'
+DEFAULT_WORKERS = 1
+HTTP_DEFAULT_WORKERS = 8
+
+# Page on the instance that loads without login: cookies can only be set for the current domain
+COOKIE_SEED_PATH = '/robots.txt'
+
+# Chrome user-data directory kept between runs, so a still-valid login is reused
+# (RNB_SNOW_CHROME_PROFILE overrides the path, an empty value disables it)
+PROFILE_DIR_ENV = 'RNB_SNOW_CHROME_PROFILE'
+DEFAULT_PROFILE_DIR = 'chrome_profile'
+
+# Optional JSON file the session cookies are saved to after login and restored from on start
+COOKIE_FILE_ENV = 'RNB_SNOW_COOKIE_FILE'
+
+# Seconds to wait for the landing page with a restored session, and for a manual login
+SESSION_CHECK_TIMEOUT = 15
+LOGIN_TIMEOUT = 600
+
+# URLs that mean the browser is not (yet) logged in
+LOGIN_URL_MARKERS = ('microsoftonline.com', 'login.do', 'login_with_sso', 'saml2')
+
+# Seconds between checks for new pending tickets in watch mode
+WATCH_INTERVAL = 30
+
+# Element each step waits for
+FORM_SCROLL_ID = "sc_req_item.form_scroll"
+EMAIL_TABLE_ID = "sc_req_item.u_email_client.u_item_table"
+EMAIL_MESSAGE_ID = "sys_original.u_email_client.u_message"
+
+# Rows of the email related list; the table element exists before its rows are filled in,
+# an empty list has a single "No records to display" row
+EMAIL_ROWS_SELECTOR = f'[id="{EMAIL_TABLE_ID}"] tbody tr'
+NO_RECORDS_ROW_CLASS = 'list2_no_records'
+
+# Seconds each step waits for its element before giving up; RNB_SNOW_WAIT_TIMEOUT sets all of them
+WAIT_TIMEOUT_ENV = 'RNB_SNOW_WAIT_TIMEOUT'
+WAIT_TIMEOUTS = {
+    'ticket_page': 20,    # FORM_SCROLL_ID after opening the ticket
+    'email_table': 10,    # EMAIL_TABLE_ID rows after scrolling to the related lists
+    'email_message': 20,  # EMAIL_MESSAGE_ID after opening the email
+}
+
+# Seconds between element checks while waiting
+WAIT_POLL_INTERVAL = 0.1
+
+class WaitTimings:
+    """Actual time spent waiting in each step, shared by all browsers of a run"""
+
+    def __init__(self):
+        self.waits = defaultdict(list)
+        self.timeouts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, step, seconds, timed_out=False):
+        with self._lock:
+            self.waits[step].append(seconds)
+            if timed_out:
+                self.timeouts[step] += 1
+
+    def summary(self):
+        lines = []
+        with self._lock:
+            for step, waits in self.waits.items():
+                lines.append(f"{step}: {len(waits)} waits, avg {sum(waits) / len(waits):.2f}s, "
+                             f"max {max(waits):.2f}s, {self.timeouts[step]} timed out")
+        return "\n".join(lines)
+
+wait_timings = WaitTimings()
+
+def set_wait_timeout(seconds):
+    """Use the same timeout for every step"""
+    for step in WAIT_TIMEOUTS:
+        WAIT_TIMEOUTS[step] = seconds
+
+def wait_until(driver, condition, step):
+    """
+    Wait until condition(driver) returns a true value and return it, recording the wait
+    under step. Raises TimeoutException after the step's timeout.
+    """
+    start = time.perf_counter()
+    try:
+        result = WebDriverWait(driver, WAIT_TIMEOUTS[step], poll_frequency=WAIT_POLL_INTERVAL).until(condition)
+    except TimeoutException:
+        wait_timings.record(step, time.perf_counter() - start, timed_out=True)
+        raise
+    wait_timings.record(step, time.perf_counter() - start)
+    return result
+
+def wait_for_element(driver, element_id, step):
+    """Wait until the element is present and return it (see wait_until)"""
+    return wait_until(driver, EC.presence_of_element_located((By.ID, element_id)), step)
+
+def email_table_rows(driver):
+    """The email table's body rows once the related list has loaded (data or "No records" row), else []"""
+    return driver.find_elements(By.CSS_SELECTOR, EMAIL_ROWS_SELECTOR)
+
+def get_servicenow_url(base_url=None):
+    """ServiceNow base URL: argument, then RNB_SNOW_URL, then the production instance"""
+    return (base_url or os.environ.get(SERVICENOW_URL_ENV) or DEFAULT_SERVICENOW_URL).rstrip('/')
+
+def get_worker_count(workers=None, default=DEFAULT_WORKERS):
+    """Concurrent extraction count: argument, then RNB_SNOW_WORKERS, then default"""
+    return max(1, int(workers or os.environ.get(WORKERS_ENV) or default))
+
+def get_profile_dir(profile_dir=None):
+    """Chrome profile directory: argument, then RNB_SNOW_CHROME_PROFILE, then chrome_profile ('' disables it)"""
+    if profile_dir is not None:
+        return profile_dir or None
+    return os.environ.get(PROFILE_DIR_ENV, DEFAULT_PROFILE_DIR) or None
+
+def profile_in_use(profile_dir):
+    """
+    True if a running Chrome holds the profile directory, which a second Chrome cannot open.
+    Windows: Chrome keeps the profile's lockfile open, so it cannot be removed (a stale one
+    is removed, Chrome recreates it). Elsewhere: the SingletonLock link names the host and
+    process of the Chrome that owns the profile.
+    """
+    if os.name == 'nt':
+        lockfile = os.path.join(profile_dir, 'lockfile')
+        try:
+            os.remove(lockfile)
+        except FileNotFoundError:
+            return False
+        except OSError:
+            return True
+        return False
+
+    try:
+        owner = os.readlink(os.path.join(profile_dir, 'SingletonLock'))
+    except OSError:
+        return False
+    host, _, pid = owner.rpartition('-')
+    if host != socket.gethostname() or not pid.isdigit():
+        # Locked by another machine (shared directory): treat as in use
+        return bool(host)
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
 
-def setup_driver():
-    """Setup Chrome driver with options to prevent logout"""
+def setup_driver(profile_dir=None):
+    """
+    Setup Chrome driver with options to prevent logout.
+    With profile_dir, Chrome keeps its profile (and so the login) in that directory.
+    """
     chrome_options = Options()
 
+    if profile_dir:
+        chrome_options.add_argument(f"--user-data-dir={os.path.abspath(profile_dir)}")
+
     # Keep session alive options
     chrome_options.add_argument("--disable-blink-features=AutomationControlled")
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
@@ -36,66 +210,162 @@ def setup_driver():
 
     return driver
 
-def get_unmatched_tickets():
-    """Get tickets that haven't been matched to accounts yet and don't have extraction status"""
-    conn = sqlite3.connect('ticket_matching.db')
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        SELECT ticket, short_description, eml_domain
-        FROM snow
-        WHERE (account_number IS NULL OR account_number = '')
-        AND (extraction_status IS NULL OR extraction_status = '')
-        ORDER BY ticket
-    ''')
-
-    tickets = cursor.fetchall()
-    conn.close()
-    return tickets
+# Accounts found by the scraper come from the email text (see create_database.match_ticket_page)
+UPDATE_ACCOUNT_SQL = '''
+    UPDATE snow
+    SET account_number = ?, account_name = ?, match_source = 'text'
+    WHERE ticket = ?
+'''
+
+UPDATE_TEXT_SQL = '''
+    UPDATE snow
+    SET text = ?, extraction_status = ?
+    WHERE ticket = ?
+'''
+
+def write_update(sql, params, writer=None):
+    """Queue the update on a BatchWriter, or run and commit it right away without one"""
+    if writer is not None:
+        writer.write(sql, params)
+        return
+
+    conn = get_connection()
+    conn.execute(sql, params)
+    conn.commit()
 
-def update_ticket_account(ticket_number, account_number, account_name):
+def update_ticket_account(ticket_number, account_number, account_name, writer=None):
     """Update ticket with found account information"""
-    conn = sqlite3.connect('ticket_matching.db')
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        UPDATE snow
-        SET account_number = ?, account_name = ?
-        WHERE ticket = ?
-    ''', (account_number, account_name, ticket_number))
-
-    conn.commit()
-    conn.close()
+    write_update(UPDATE_ACCOUNT_SQL, (account_number, account_name, ticket_number), writer)
     print(f"Updated {ticket_number} with account {account_number} ({account_name})")
 
-def update_ticket_text(ticket_number, text):
+def update_ticket_text(ticket_number, text, writer=None):
     """Update ticket with extracted email text"""
-    conn = sqlite3.connect('ticket_matching.db')
-    cursor = conn.cursor()
-
     status = 'extracted' if text and text.strip() else 'nothing_to_extract'
 
-    cursor.execute('''
-        UPDATE snow
-        SET text = ?, extraction_status = ?
-        WHERE ticket = ?
-    ''', (text, status, ticket_number))
-
-    conn.commit()
-    conn.close()
+    write_update(UPDATE_TEXT_SQL, (text, status, ticket_number), writer)
     print(f"Updated {ticket_number} with email text ({len(text) if text else 0} characters) - Status: {status}")
 
+def copy_session_cookies(source_driver, target_driver, base_url):
+    """Copy the logged-in ServiceNow cookies of source_driver into target_driver. Returns the count copied."""
+    target_driver.get(base_url + COOKIE_SEED_PATH)
+
+    copied = 0
+    for cookie in source_driver.get_cookies():
+        try:
+            target_driver.add_cookie(cookie)
+            copied += 1
+        except Exception as e:
+            print(f"Could not copy cookie {cookie.get('name')}: {e}")
+    return copied
+
+def save_session_cookies(driver, cookie_file):
+    """Write the browser's ServiceNow cookies to a JSON file"""
+    with open(cookie_file, 'w', encoding='utf-8') as f:
+        json.dump(driver.get_cookies(), f)
+
+def restore_session_cookies(driver, base_url, cookie_file):
+    """Add still-valid cookies from a JSON file to the browser. Returns the count restored."""
+    if not cookie_file or not os.path.exists(cookie_file):
+        return 0
+    with open(cookie_file, encoding='utf-8') as f:
+        cookies = json.load(f)
+
+    driver.get(base_url + COOKIE_SEED_PATH)
+    restored = 0
+    now = time.time()
+    for cookie in cookies:
+        if cookie.get('expiry') is not None and cookie['expiry'] < now:
+            continue
+        try:
+            driver.add_cookie(cookie)
+            restored += 1
+        except Exception as e:
+            print(f"Could not restore cookie {cookie.get('name')}: {e}")
+    return restored
+
+def is_landing_page(driver, base_url):
+    """
+    True once the browser shows a logged-in ServiceNow page: on the instance, not on a
+    login page, fully loaded and redirected away from the bare instance URL (a logged-in
+    session is sent on to the navigator, an anonymous one to the login page).
+    """
+    current_url = driver.current_url
+    if not current_url.startswith(base_url) or any(marker in current_url for marker in LOGIN_URL_MARKERS):
+        return False
+    if urlparse(current_url).path in ('', '/'):
+        return False
+    return driver.execute_script("return document.readyState") == 'complete'
+
+def wait_for_landing_page(driver, base_url, timeout):
+    """Wait up to timeout seconds for the ServiceNow landing page. Returns True if it was reached."""
+    start = time.perf_counter()
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=1).until(lambda d: is_landing_page(d, base_url))
+    except TimeoutException:
+        wait_timings.record('login', time.perf_counter() - start, timed_out=True)
+        return False
+    wait_timings.record('login', time.perf_counter() - start)
+    return True
+
+def login(driver, base_url, cookie_file=None, timeout=LOGIN_TIMEOUT):
+    """
+    Open ServiceNow and make sure the browser is logged in. A session that is still valid
+    (persistent profile or restored cookies) is detected right away; otherwise waits for
+    the manual Microsoft login. Raises TimeoutException if nobody logs in within timeout.
+    """
+    restored = restore_session_cookies(driver, base_url, cookie_file)
+    if restored:
+        print(f"Restored {restored} session cookies from {cookie_file}")
+
+    print(f"Navigating to {base_url}/")
+    driver.get(f"{base_url}/")
+
+    if wait_for_landing_page(driver, base_url, SESSION_CHECK_TIMEOUT):
+        print(f"✓ Existing session reused! Current URL: {driver.current_url}")
+    else:
+        # Wait for Microsoft login redirect and manual login
+        print("Waiting for login to complete...")
+        print("Please complete the Microsoft login process in the browser")
+        print(f"Script will continue when you're back on ServiceNow ({base_url})")
+        if not wait_for_landing_page(driver, base_url, timeout):
+            raise TimeoutException(f"Not logged in to {base_url} after {timeout}s")
+        print(f"✓ Login successful! Current URL: {driver.current_url}")
+
+    if cookie_file:
+        save_session_cookies(driver, cookie_file)
+
+def open_worker_drivers(driver, count, base_url):
+    """
+    The logged-in driver plus count - 1 new drivers that share its session cookies.
+    Drivers that fail to start are left out.
+    """
+    drivers = [driver]
+    for _ in range(count - 1):
+        try:
+            worker_driver = setup_driver()
+        except Exception as e:
+            print(f"Could not start an additional browser: {e}")
+            break
+        copied = copy_session_cookies(driver, worker_driver, base_url)
+        print(f"Started browser {len(drivers) + 1} with {copied} session cookies")
+        drivers.append(worker_driver)
+    return drivers
+
 def scroll_to_bottom(driver):
-    element = driver.find_element(By.ID, "sc_req_item.form_scroll")
+    element = wait_for_element(driver, FORM_SCROLL_ID, 'ticket_page')
     driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight;", element)
 
 def click_first_created_link(driver):
     """
-    Find the 'Created' column in the email table and click the first link
+    Find the 'Created' column in the email table and click the first link.
+    Raises TimeoutException if the email list does not load, so the ticket is retried
+    instead of being marked as having no email.
     """
     try:
-        # Find the email table
-        table = driver.find_element(By.ID, "sc_req_item.u_email_client.u_item_table")
+        # Wait for the rows of the email table (a related list, loaded once the form is
+        # scrolled to the bottom), not just the table element that is there before them
+        rows = wait_until(driver, email_table_rows, 'email_table')
+        table = driver.find_element(By.ID, EMAIL_TABLE_ID)
 
         # Find the header row to locate the 'Created' column index
         header_row = table.find_element(By.TAG_NAME, "thead").find_element(By.TAG_NAME, "tr")
@@ -113,9 +383,8 @@ def click_first_created_link(driver):
             print("Could not find 'Created' column in table")
             return False
 
-        # Find the table body and get the first data row
-        tbody = table.find_element(By.TAG_NAME, "tbody")
-        data_rows = tbody.find_elements(By.TAG_NAME, "tr")
+        # Data rows, without the "No records to display" row of an empty list
+        data_rows = [row for row in rows if NO_RECORDS_ROW_CLASS not in (row.get_attribute("class") or "")]
 
         if not data_rows:
             print("No data rows found in table")
@@ -150,208 +419,322 @@ def click_first_created_link(driver):
             print("No links found in 'Created' column cell")
             return False
 
+    except TimeoutException:
+        print(f"Email table did not load within {WAIT_TIMEOUTS['email_table']}s")
+        raise
     except Exception as e:
         print(f"Error clicking 'Created' link: {e}")
         return False
 
 def extract_email_text(driver):
-    """Extract email message text from the email page"""
+    """Extract email message text from the email page (raises TimeoutException if it does not load)"""
     try:
-        element = driver.find_element(By.ID, "sys_original.u_email_client.u_message")
+        element = wait_for_element(driver, EMAIL_MESSAGE_ID, 'email_message')
         value = element.get_attribute("value")
         return value if value else ""
+    except TimeoutException:
+        print(f"Email message did not load within {WAIT_TIMEOUTS['email_message']}s")
+        raise
     except Exception as e:
         print(f"Error extracting email text: {e}")
         return ""
 
-def is_valid_account_range(account_number):
-    """
-    Check if account number is in valid ranges:
-    20600000-20699999, 25300000-25399999, 20300000-24999999, 25900000-25999999
-    """
-    try:
-        num = int(account_number)
-        return (
-            (20600000 <= num <= 20699999) or
-            (25300000 <= num <= 25399999) or
-            (20300000 <= num <= 24999999) or
-            (25900000 <= num <= 25999999)
-        )
-    except (ValueError, TypeError):
-        return False
+def load_account_index():
+    """The in-memory SAP lookup index, built once and rebuilt only after a SAP reload"""
+    conn = get_connection()
+    index = get_account_index(conn, get_sap_generation(conn))
+    return index
 
-def find_account_in_text(text):
-    """
-    Find account matches in email text using the same logic as create_database.py:
-    - 10 digits starting with 00: drop 00, look up 8 digits in customer
-    - 8 digits: look up directly in customer
-    - 10 digits NOT starting with 00: look up in document_number or reference
-    - XXX-XXXXX format: combine digits and try as 8-digit customer lookup
-    - XX-XXXXXX format: combine digits and try as 8-digit customer lookup
-    - Valid range check: if account is in valid ranges, accept even if not in SAP
+def find_account_in_text(text, index=None):
     """
-    conn = sqlite3.connect('ticket_matching.db')
-    cursor = conn.cursor()
-    matches = []
-
-    # Extract regular numbers from text (8-10 digits)
-    numbers = re.findall(r'\b\d{8,10}\b', text)
-
-    # Extract dash-separated formats like "239-63450" and "20-572883"
-    dash_numbers_3_5 = re.findall(r'\b(\d{3})-(\d{5})\b', text)
-    dash_numbers_2_6 = re.findall(r'\b(\d{2})-(\d{6})\b', text)
-
-    # Process dash-separated numbers first
-    # Handle XXX-XXXXX format (3-5 digits)
-    for part1, part2 in dash_numbers_3_5:
-        combined = part1 + part2  # "239" + "63450" = "23963450"
-        if len(combined) == 8:
-            # First try SAP lookup
-            cursor.execute("SELECT * FROM sap WHERE customer = ?", (combined,))
-            results = cursor.fetchall()
-            if results:
-                matches.extend([(combined, 'customer_dash', results[0])])
-            elif is_valid_account_range(combined):
-                # Valid range but not in SAP - create fake record
-                fake_record = ('', '', 0, '', 'VALID ACCOUNT (NOT IN SAP)', combined)
-                matches.extend([(combined, 'customer_dash_valid', fake_record)])
-
-    # Handle XX-XXXXXX format (2-6 digits)
-    for part1, part2 in dash_numbers_2_6:
-        combined = part1 + part2  # "20" + "572883" = "20572883"
-        if len(combined) == 8:
-            # First try SAP lookup
-            cursor.execute("SELECT * FROM sap WHERE customer = ?", (combined,))
-            results = cursor.fetchall()
-            if results:
-                matches.extend([(combined, 'customer_dash', results[0])])
-            elif is_valid_account_range(combined):
-                # Valid range but not in SAP - create fake record
-                fake_record = ('', '', 0, '', 'VALID ACCOUNT (NOT IN SAP)', combined)
-                matches.extend([(combined, 'customer_dash_valid', fake_record)])
-
-    # Process regular numbers
-    for number in numbers:
-        if len(number) == 10 and number.startswith('00'):
-            # Drop 00 and look up 8 digit number in customer
-            account_num = number[2:]
-            cursor.execute("SELECT * FROM sap WHERE customer = ?", (account_num,))
-            results = cursor.fetchall()
-            if results:
-                matches.extend([(account_num, 'customer', results[0])])
-            elif is_valid_account_range(account_num):
-                # Valid range but not in SAP
-                fake_record = ('', '', 0, '', 'VALID ACCOUNT (NOT IN SAP)', account_num)
-                matches.extend([(account_num, 'customer_valid', fake_record)])
-
-        elif len(number) == 8:
-            # Look up directly in customer
-            cursor.execute("SELECT * FROM sap WHERE customer = ?", (number,))
-            results = cursor.fetchall()
-            if results:
-                matches.extend([(number, 'customer', results[0])])
-            elif is_valid_account_range(number):
-                # Valid range but not in SAP
-                fake_record = ('', '', 0, '', 'VALID ACCOUNT (NOT IN SAP)', number)
-                matches.extend([(number, 'customer_valid', fake_record)])
-
-        elif len(number) == 10 and not number.startswith('00'):
-            # Look up in document_number or reference (invoice number)
-            cursor.execute("SELECT * FROM sap WHERE document_number = ? OR reference = ?", (number, number))
-            results = cursor.fetchall()
-            if results:
-                matches.extend([(number, 'invoice', results[0])])
-
-    conn.close()
-    return matches
-
-def manual_debug_session():
-    """
-    Main function that sets up Selenium and pauses for manual interaction
+    Find account matches in email text using the shared account_matcher rules
+    (same logic as create_database.py).
+    SAP lookups go through the in-memory AccountIndex (built once per run).
     """
+    if index is None:
+        index = load_account_index()
+    return find_matches(text, index)
 
-    # Get unmatched tickets
-    tickets = get_unmatched_tickets()
-    driver = setup_driver()
-    print(f"\nFound {len(tickets)} unmatched tickets to process")
-
-    # Navigate to ServiceNow login page first
-    print("\n=== LOGGING INTO SERVICENOW ===")
-    print("Navigating to https://emeops03.service-now.com/")
-    driver.get("https://emeops03.service-now.com/")
-
-    # Wait for Microsoft login redirect and manual login
-    print("Waiting for login to complete...")
-    print("Please complete the Microsoft login process in the browser")
-    print("Script will continue when you're back on ServiceNow (emeops03.service-now.com)")
-    time.sleep(30)
-    # Wait until we're back on ServiceNow domain (not just a parameter in Microsoft login)
-    while True:
-        current_url = driver.current_url
-        if current_url.startswith("https://emeops03.service-now.com") and "microsoftonline.com" not in current_url:
-            print(f"✓ Login successful! Current URL: {current_url}")
-            break
-        else:
-            print(f"Still on login page: {current_url[:80]}...")
-            time.sleep(2)
+def extract_ticket(driver, ticket_number, base_url):
+    """Open a ticket and its first email. Returns the email text ('' if there is none)."""
+    ticket_url = f"{base_url}/text_search_exact_match.do?sysparm_search={ticket_number}"
+    driver.get(ticket_url)
+
+    # Scroll to see the email table (waits for the ticket form)
+    scroll_to_bottom(driver)
+
+    # Click the first link in the 'Created' column
+    if not click_first_created_link(driver):
+        print(f"{ticket_number}: Failed to click 'Created' link - marked as 'nothing_to_extract'")
+        return ""
+
+    print(f"{ticket_number}: Successfully clicked 'Created' link")
 
-    print("Starting ticket processing...")
-    time.sleep(2)
+    # Extract email message text (waits for the email page)
+    return extract_email_text(driver)
 
-    # Now iterate over tickets
-    for ticket in tickets:
-        ticket_number = ticket[0]
-        print(f"\nProcessing ticket: {ticket_number}")
-        ticket_url = f"https://emeops03.service-now.com/text_search_exact_match.do?sysparm_search={ticket_number}"
-        driver.get(ticket_url)
+def save_ticket_result(ticket_number, email_text, account_index, writer=None):
+    """Store the extracted text and the account found in it (through writer, if given)"""
+    # Always update the ticket text and extraction status
+    update_ticket_text(ticket_number, email_text, writer)
 
+    if email_text and email_text.strip():
+        print(f"Extracted email text ({len(email_text)} characters)")
+
+        # Find account numbers in the email text
+        matches = find_account_in_text(email_text, account_index)
+        if matches:
+            # Take the first match for account assignment
+            number, match_type, sap_record = matches[0]
+            account_number, account_name = account_from_match(matches[0])
+
+            update_ticket_account(ticket_number, account_number, account_name, writer)
+            print(f"Found account {account_number} via {match_type} in email text")
+        else:
+            print("No account numbers found in email text")
+    else:
+        print("No email text found - marked as 'nothing_to_extract'")
+
+def driver_pool_extractor(drivers, base_url):
+    """extract(ticket_number) function that runs each ticket on an idle driver"""
+    idle_drivers = queue.Queue()
+    for driver in drivers:
+        idle_drivers.put(driver)
+
+    def extract(ticket_number):
+        driver = idle_drivers.get()
         try:
-            # Wait for page to load
-            time.sleep(2)
-
-            # Scroll to see the email table
-            scroll_to_bottom(driver)
-            time.sleep(1)
-
-            # Click the first link in the 'Created' column
-            if click_first_created_link(driver):
-                print("Successfully clicked 'Created' link")
-                time.sleep(2)  # Wait for new page to load
-
-                # Extract email message text
-                email_text = extract_email_text(driver)
-                # Always update the ticket text and extraction status
-                update_ticket_text(ticket_number, email_text)
-
-                if email_text and email_text.strip():
-                    print(f"Extracted email text ({len(email_text)} characters)")
-
-                    # Find account numbers in the email text
-                    matches = find_account_in_text(email_text)
-                    if matches:
-                        # Take the first match for account assignment
-                        number, match_type, sap_record = matches[0]
-                        account_number = sap_record[5] if sap_record[5] else number  # customer field
-                        account_name = sap_record[4] if sap_record[4] else ''  # name field
-
-                        update_ticket_account(ticket_number, account_number, account_name)
-                        print(f"Found account {account_number} via {match_type} in email text")
-                    else:
-                        print("No account numbers found in email text")
-                else:
-                    print("No email text found - marked as 'nothing_to_extract'")
+            print(f"\nProcessing ticket: {ticket_number}")
+            return extract_ticket(driver, ticket_number, base_url)
+        finally:
+            idle_drivers.put(driver)
 
-            else:
-                print("Failed to click 'Created' link - marked as 'nothing_to_extract'")
-                update_ticket_text(ticket_number, "")
+    return extract
 
-        except Exception as e:
-            print(f"Error processing ticket {ticket_number}: {e}")
+def extract_tickets_concurrently(extract, tickets, account_index, workers, writer=None, claims=None):
+    """
+    Run extract(ticket_number) -> email text for all tickets in workers threads.
+    Results are saved from this thread only. With claims (an ExtractionQueue) tickets are
+    marked done when saved and handed back to the queue when they fail or are cancelled.
+    Returns the ticket numbers that failed.
+    """
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(extract, ticket[0]): ticket[0] for ticket in tickets}
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                ticket_number = futures[future]
+                try:
+                    email_text = future.result()
+                except Exception as e:
+                    print(f"Error processing ticket {ticket_number}: {e}")
+                    failed.append(ticket_number)
+                    if claims:
+                        claims.release(ticket_number, writer)
+                    continue
+                save_ticket_result(ticket_number, email_text, account_index, writer)
+                if claims:
+                    claims.complete(ticket_number, writer)
+                print(f"[{done}/{len(futures)}] {ticket_number} done")
+        except KeyboardInterrupt:
+            # Let the tickets in progress finish, drop the rest
+            for future, ticket_number in futures.items():
+                if future.cancel() and claims:
+                    claims.release(ticket_number, writer)
+            raise
+    return failed
+
+class ScraperSession:
+    """
+    A logged-in browser that runs any number of extraction batches, e.g. one per set of
+    tickets loaded by the GUI, without starting Chrome or logging in again.
+    """
 
-        # Add a small pause between tickets
-        time.sleep(1)
+    def __init__(self, workers=None, base_url=None, backend=None, profile_dir=None, cookie_file=None):
+        self.base_url = get_servicenow_url(base_url)
+        self.backend = backend or os.environ.get(BACKEND_ENV) or 'browser'
+        if self.backend not in EXTRACTION_BACKENDS:
+            raise ValueError(f"Unknown extraction backend {self.backend!r}, expected one of {EXTRACTION_BACKENDS}")
+        self.workers = get_worker_count(workers, HTTP_DEFAULT_WORKERS if self.backend == 'http' else DEFAULT_WORKERS)
+        self.profile_dir = get_profile_dir(profile_dir)
+        self.cookie_file = cookie_file or os.environ.get(COOKIE_FILE_ENV) or None
+        self.driver = None
+        self.claims = None
+        # True when the last batch stopped because all its tickets failed (e.g. session expired)
+        self.batch_failed = False
+        self._temporary_profile = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the browser and log in (reusing a still-valid session)"""
+        # Bring an older database up to the current schema before writing results
+        create_database()
+        self.claims = ExtractionQueue()
+
+        # Another scraper process already runs Chrome on the persistent profile: use a
+        # temporary one (the login is then not reused, but the cookie file still is)
+        if self.profile_dir and profile_in_use(self.profile_dir):
+            self._temporary_profile = tempfile.mkdtemp(prefix='chrome_profile_')
+            print(f"Chrome profile {self.profile_dir} is in use by another session, "
+                  f"using temporary profile {self._temporary_profile}")
+            self.profile_dir = self._temporary_profile
+
+        self.driver = setup_driver(self.profile_dir)
+        print("\n=== LOGGING INTO SERVICENOW ===")
+        login(self.driver, self.base_url, self.cookie_file)
+        return self
+
+    def is_alive(self):
+        """True while the browser is still open"""
+        if self.driver is None:
+            return False
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
 
+    def run_batch(self):
+        """
+        Queue the tickets that are pending now and extract them.
+        Returns the number of tickets that were available to claim.
+        """
+        with self._lock:
+            pending = self.claims.enqueue_pending()
+            print(f"\nFound {pending} unmatched tickets to process (worker {self.claims.worker_id})")
+            if not pending:
+                return 0
+
+            account_index = load_account_index()
+            print("Starting ticket processing...")
+
+            # Results are committed in batches by one writer thread, flushed on exit and Ctrl-C
+            with BatchWriter() as writer:
+                self.batch_failed = run_extraction(self.driver, self.claims, account_index, self.base_url,
+                                                   self.backend, self.workers, writer)
+            print(f"\nSaved {writer.written} updates in {writer.commits} commits")
+            print(f"Extraction queue: {self.claims.counts()}")
+            return pending
+
+    def ensure_logged_in(self):
+        """
+        Check that the browser is still logged in and, if the session expired, wait for a
+        new manual login. Returns False if nobody logged in within LOGIN_TIMEOUT.
+        """
+        try:
+            login(self.driver, self.base_url, self.cookie_file)
+        except TimeoutException as e:
+            print(f"{e}, stopping")
+            return False
+        return True
+
+    def close(self):
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+        if self._temporary_profile:
+            shutil.rmtree(self._temporary_profile, ignore_errors=True)
+            self._temporary_profile = None
+
+def manual_debug_session(workers=None, base_url=None, backend=None, profile_dir=None,
+                         cookie_file=None, watch=False):
+    """
+    Main function that sets up Selenium and pauses for manual interaction.
+    With workers > 1 (or RNB_SNOW_WORKERS), that many browsers share the login and
+    extract tickets concurrently. backend='http' (or RNB_SNOW_BACKEND) only logs in with
+    the browser and reads the emails over the REST Table API, workers requests at a time.
+    Tickets are claimed from the extraction queue in small batches, so several sessions
+    can run at once and an interrupted session is resumed by the next one.
+    watch=True keeps the logged-in browser open and extracts newly loaded tickets every
+    WATCH_INTERVAL seconds until interrupted. When a whole batch fails it checks the
+    login: an expired session waits for a new manual login, and the watch stops if
+    nobody logs in. The browser (and a temporary profile) is closed at the end.
+    """
+    session = ScraperSession(workers, base_url, backend, profile_dir, cookie_file)
+    try:
+        session.start()
+        while True:
+            session.run_batch()
+            if not watch:
+                break
+            if session.batch_failed and not session.ensure_logged_in():
+                break
+            time.sleep(WATCH_INTERVAL)
+    except KeyboardInterrupt:
+        print("\nStopped")
+    finally:
+        session.close()
+        if wait_timings.waits:
+            print("\nPage wait times:")
+            print(wait_timings.summary())
+
+def run_extraction(driver, claims, account_index, base_url, backend, workers, writer=None):
+    """
+    Claim batches of tickets from the extraction queue until it is drained, and extract
+    and save them with the logged-in driver, using the chosen backend. Tickets that fail
+    are not claimed again in this run, and the run stops when a whole batch fails (session
+    expired, network down), leaving the tickets queued for the next run.
+    Returns True if it stopped because a whole batch failed, False once the queue is drained.
+    """
+    close = None
+    if backend == 'http':
+        client = TableApiClient.from_driver(driver, base_url, pool_size=workers)
+        extract, close = client.get_email_text, client.close
+        print(f"Extracting over the Table API with {workers} parallel requests")
+    else:
+        drivers = open_worker_drivers(driver, workers, base_url) if workers > 1 else [driver]
+        extract, workers = driver_pool_extractor(drivers, base_url), len(drivers)
+        if len(drivers) > 1:
+            print(f"Extracting with {len(drivers)} browsers")
+
+            # The logged-in browser stays open, like in single-browser mode
+            def close():
+                for worker_driver in drivers[1:]:
+                    worker_driver.quit()
+
+    try:
+        batch_size = max(CLAIM_BATCH_SIZE, workers * 2)
+        failed = set()
+        while True:
+            tickets = claims.claim(batch_size, exclude=failed)
+            if not tickets:
+                return False
+            batch_failed = extract_tickets_concurrently(extract, tickets, account_index, workers, writer, claims)
+            failed.update(batch_failed)
+            if len(batch_failed) == len(tickets):
+                print(f"All {len(tickets)} tickets of the batch failed (session expired or network down?), "
+                      f"stopping; they stay queued for the next run")
+                return True
+    finally:
+        if close:
+            close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract email text for unmatched ServiceNow tickets")
+    parser.add_argument('--workers', type=int, default=None,
+                        help=f"concurrent browsers sharing one login, or parallel requests with --backend http "
+                             f"(default: ${WORKERS_ENV}, else {DEFAULT_WORKERS} / {HTTP_DEFAULT_WORKERS})")
+    parser.add_argument('--backend', choices=EXTRACTION_BACKENDS, default=None,
+                        help=f"extract through the browser or the REST Table API (default: ${BACKEND_ENV} or browser)")
+    parser.add_argument('--url', default=None,
+                        help=f"ServiceNow base URL (default: ${SERVICENOW_URL_ENV} or {DEFAULT_SERVICENOW_URL})")
+    parser.add_argument('--wait-timeout', type=float, default=os.environ.get(WAIT_TIMEOUT_ENV),
+                        help=f"seconds to wait for each page element (default: ${WAIT_TIMEOUT_ENV} or per step)")
+    parser.add_argument('--profile-dir', default=None,
+                        help=f"persistent Chrome profile directory, '' for a fresh profile "
+                             f"(default: ${PROFILE_DIR_ENV} or {DEFAULT_PROFILE_DIR})")
+    parser.add_argument('--cookie-file', default=None,
+                        help=f"JSON file to save and restore the session cookies (default: ${COOKIE_FILE_ENV})")
+    parser.add_argument('--watch', action='store_true',
+                        help=f"keep the browser open and extract newly loaded tickets every {WATCH_INTERVAL}s")
+    args = parser.parse_args(argv)
+
+    if args.wait_timeout:
+        set_wait_timeout(float(args.wait_timeout))
+
+    manual_debug_session(workers=args.workers, base_url=args.url, backend=args.backend,
+                         profile_dir=args.profile_dir, cookie_file=args.cookie_file, watch=args.watch)
 
 
 if __name__ == "__main__":
-    manual_debug_session()
\ No newline at end of file
+    main()
@@ -0,0 +1,95 @@
+"""
+ServiceNow REST Table API client for browserless email extraction.
+
+Reuses the cookies (and the g_ck session token) of a browser that is logged in to
+ServiceNow, so Selenium is only needed for the login. Requests go over one pooled
+keep-alive urllib3 connection pool (urllib3 is installed with Selenium) and can be made
+from many threads at once.
+"""
+import json
+from urllib.parse import urlencode
+
+import urllib3
+
+# Table and fields holding the request items and their emails
+REQUEST_ITEM_TABLE = 'sc_req_item'
+EMAIL_TABLE = 'u_email_client'
+EMAIL_ITEM_FIELD = 'u_item'
+EMAIL_MESSAGE_FIELD = 'u_message'
+
+# The email the browser backend opens: first row of the emails related list, by Created
+EMAIL_ORDER = 'ORDERBYsys_created_on'
+
+# Seconds to connect / read one response
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+
+# Retries for dropped connections, throttling (429) and server errors
+RETRIES = urllib3.Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                        redirect=False, raise_on_status=False)
+
+
+class TableApiError(Exception):
+    """A Table API request failed (status, redirect to login or invalid response)"""
+
+
+class TableApiClient:
+    """Table API client authenticated with a browser session's cookies"""
+
+    def __init__(self, base_url, cookies, user_token=None, pool_size=8):
+        self.base_url = base_url.rstrip('/')
+        self.headers = {
+            'Accept': 'application/json',
+            'Cookie': '; '.join(f"{cookie['name']}={cookie['value']}" for cookie in cookies),
+        }
+        if user_token:
+            self.headers['X-UserToken'] = user_token
+
+        self.pool = urllib3.PoolManager(
+            maxsize=pool_size, block=True, retries=RETRIES,
+            timeout=urllib3.Timeout(connect=CONNECT_TIMEOUT, read=READ_TIMEOUT))
+
+    @classmethod
+    def from_driver(cls, driver, base_url, pool_size=8):
+        """Client using the session of a logged-in Selenium driver"""
+        try:
+            user_token = driver.execute_script("return window.g_ck || null")
+        except Exception:
+            user_token = None
+        return cls(base_url, driver.get_cookies(), user_token, pool_size)
+
+    def get_records(self, table, query, fields, limit=None):
+        """Records of table matching an encoded query, with only the given fields"""
+        params = {'sysparm_query': query, 'sysparm_fields': ','.join(fields),
+                  'sysparm_exclude_reference_link': 'true'}
+        if limit is not None:
+            params['sysparm_limit'] = limit
+        url = f"{self.base_url}/api/now/table/{table}?{urlencode(params)}"
+
+        response = self.pool.request('GET', url, headers=self.headers, redirect=False)
+        if 300 <= response.status < 400:
+            raise TableApiError(f"{table}: redirected to {response.headers.get('Location')} (session expired?)")
+        if response.status != 200:
+            raise TableApiError(f"{table}: HTTP {response.status}")
+
+        try:
+            return json.loads(response.data)['result']
+        except (ValueError, KeyError) as e:
+            raise TableApiError(f"{table}: invalid response ({e})")
+
+    def get_email_text(self, ticket_number):
+        """Message of the ticket's first email ('' if the ticket or email does not exist)"""
+        items = self.get_records(REQUEST_ITEM_TABLE, f"number={ticket_number}", ['sys_id'], limit=1)
+        if not items:
+            print(f"{ticket_number}: request item not found")
+            return ""
+
+        emails = self.get_records(EMAIL_TABLE, f"{EMAIL_ITEM_FIELD}={items[0]['sys_id']}^{EMAIL_ORDER}",
+                                  [EMAIL_MESSAGE_FIELD], limit=1)
+        if not emails:
+            print(f"{ticket_number}: no emails")
+            return ""
+        return emails[0].get(EMAIL_MESSAGE_FIELD) or ""
+
+    def close(self):
+        self.pool.clear()
@@ -0,0 +1,86 @@
+"""AccountIndex and its SQL counterpart SqlAccountLookup on a temporary database"""
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from account_index import AccountIndex, SqlAccountLookup, INVOICE_LOOKUP_SQL
+from account_matcher import find_matches
+from create_database import create_database, load_sap_data, SAP_INDEXED_COLUMNS
+from db_connection import close_connection
+from generate_test_data import generate_test_data
+
+# SAP records: (document_number, reference, value, currency, name, customer), inserted in this order
+SAP_RECORDS = [
+    ('1400000002', '9000000002', 20.0, 'EUR', 'ACME GMBH', '21000001'),
+    ('1400000001', '9000000001', 10.0, 'EUR', 'ACME GMBH', '21000001'),
+    ('1400000003', '1400000003', 30.0, 'EUR', 'BETA AG', '00012345'),
+    ('1400000004', '1400000001', 40.0, 'EUR', '', ''),
+    ('1400000005', '9000000005', 50.0, 'EUR', 'GAMMA KG', '23963450'),
+]
+
+TEXTS = ['Kunde 21000001', 'Kunde 0000012345', 'Kto 239-63450', 'Rechnung 1400000001',
+         'Referenz 1400000003', 'Referenz 9000000005', 'Konto 20572883', 'Rechnung 1499999999']
+
+
+class AccountIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'test.db')
+        self.conn = create_database(self.db_path)
+        self.conn.executemany('''
+            INSERT INTO sap (document_number, reference, company_code_currency_value,
+                             company_code_currency_key, name, customer)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', SAP_RECORDS)
+        self.conn.commit()
+
+    def tearDown(self):
+        close_connection(self.db_path)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_sql_lookup_returns_the_same_records_in_the_same_order(self):
+        index = AccountIndex.from_connection(self.conn)
+        lookup = SqlAccountLookup(self.conn)
+
+        for number in ['21000001', '00012345', '', '99999999']:
+            self.assertEqual(lookup.find_customer(number), index.find_customer(number), number)
+        for number in ['1400000001', '1400000003', '9000000005', '1499999999']:
+            self.assertEqual(lookup.find_invoice(number), index.find_invoice(number), number)
+        for text in TEXTS:
+            self.assertEqual(find_matches(text, lookup), find_matches(text, index), text)
+
+    def test_repr_does_not_measure_memory(self):
+        index = AccountIndex.from_connection(self.conn)
+
+        self.assertEqual(repr(index), "AccountIndex(5 records, 4 customers, 8 invoice keys)")
+        self.assertIsNone(index._memory_usage)
+        self.assertGreater(index.memory_usage(), 0)
+
+    def invoice_lookup_plan(self):
+        return [row[3] for row in self.conn.execute("EXPLAIN QUERY PLAN " + INVOICE_LOOKUP_SQL, ('', ''))]
+
+    def assert_invoice_lookup_uses_indexes(self):
+        plan = self.invoice_lookup_plan()
+        for column in SAP_INDEXED_COLUMNS:
+            self.assertTrue(any(step.startswith('SEARCH') and f'({column}=?)' in step for step in plan),
+                            f"no index search on {column}: {plan}")
+        self.assertFalse(any(step.startswith('SCAN sap') for step in plan), plan)
+
+    def test_invoice_lookup_searches_both_indexes(self):
+        self.assert_invoice_lookup_uses_indexes()
+
+    def test_invoice_lookup_searches_both_indexes_after_reload(self):
+        # A reload swaps in the staging table with its own indexes
+        sap_file, _ = generate_test_data(self.temp_dir, sap_rows=200, tickets=1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            load_sap_data(self.conn, sap_file)
+        self.conn.execute("ANALYZE")
+        self.assert_invoice_lookup_uses_indexes()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""engine='pandas' (batch_matcher) against engine='python' over descriptions and email text"""
+import contextlib
+import importlib.util
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from account_index import AccountIndex
+from account_matcher import find_first_account
+from create_database import create_database, load_sap_data, load_snow_data, process_all_tickets
+from db_connection import close_connection
+from generate_test_data import generate_test_data
+
+HAS_NUMPY = importlib.util.find_spec('numpy') is not None
+
+# SAP records: (document_number, reference, value, currency, name, customer)
+SAP_RECORDS = [
+    ('1400000001', '9000000001', 10.0, 'EUR', 'ACME GMBH', '21000001'),
+    ('1400000002', '9000000002', 20.0, 'EUR', 'ACME GMBH', '21000001'),
+    ('1400000003', '1400000003', 30.0, 'EUR', 'BETA AG', '00012345'),
+    ('1400000004', '9000000004', 40.0, 'EUR', '', ''),
+    ('1400000005', '9000000005', 50.0, 'EUR', 'GAMMA KG', '23963450'),
+]
+
+# Texts covering every candidate kind, the priority rules and odd input
+TEXTS = [
+    None, '', 'Zahlungsavis', 'Kunde 21000001', 'Kunde 0021000001', 'Kto 239-63450', 'Kd 20-572883',
+    'Rechnung 1400000002 und 21000001', '21000001 vor 239-63450 und 20-572883',
+    '20-572883 nach 239-63450', 'Referenz 9000000005', 'Beleg 1400000004 ohne Kunde',
+    'Nummer 123456789 hat 9 Stellen', '12345678901 ist zu lang', 'abc21000001 im Wort',
+    'Konto 20572883 unbekannt', 'Konto 19999999 ausserhalb', 'Kunde ٢١٠٠٠٠٠١ arabisch',
+    'Konto ٢٠٥٧٢٨٨٣ arabisch unbekannt', 'Steuer\x0021000001 mit Nullzeichen', '1400000003',
+    'Mehrzeilig\n21000001\n20-572883', '00012345 und 0000012345',
+]
+
+
+@unittest.skipUnless(HAS_NUMPY, "engine='pandas' needs numpy")
+class FirstMatchesTest(unittest.TestCase):
+
+    def setUp(self):
+        customers = {}
+        invoices = {}
+        for record in SAP_RECORDS:
+            customers.setdefault(record[5], []).append(record)
+            invoices.setdefault(record[0], []).append(record)
+            if record[1] != record[0]:
+                invoices.setdefault(record[1], []).append(record)
+        self.index = AccountIndex(customers, invoices)
+
+    def test_same_first_match_as_find_first_account(self):
+        from batch_matcher import first_matches
+
+        self.assertEqual(first_matches(TEXTS, self.index), [find_first_account(text, self.index) for text in TEXTS])
+
+    def test_each_text_on_its_own(self):
+        from batch_matcher import first_matches
+
+        for text in TEXTS:
+            self.assertEqual(first_matches([text], self.index), [find_first_account(text, self.index)], text)
+        self.assertEqual(first_matches([], self.index), [])
+
+
+@unittest.skipUnless(HAS_NUMPY, "engine='pandas' needs numpy")
+class MatchEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'test.db')
+        sap_file, snow_file = generate_test_data(self.temp_dir, sap_rows=2000, tickets=3000, seed=1)
+        self.conn = create_database(self.db_path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            load_sap_data(self.conn, sap_file)
+            load_snow_data(self.conn, snow_file)
+
+        # Email text for every other ticket: another ticket's description, so some have an account
+        tickets = [row[0] for row in self.conn.execute("SELECT ticket FROM snow ORDER BY ticket")]
+        descriptions = [row[0] for row in self.conn.execute("SELECT short_description FROM snow ORDER BY ticket DESC")]
+        self.conn.executemany("UPDATE snow SET text = ? WHERE ticket = ?",
+                              [(f"Hallo,\n{description}\nGruss", ticket)
+                               for ticket, description in list(zip(tickets, descriptions))[::2]])
+        self.conn.commit()
+
+    def tearDown(self):
+        close_connection(self.db_path)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def match(self, engine, page_size=None):
+        with contextlib.redirect_stdout(io.StringIO()):
+            matched = process_all_tickets(self.conn, force_full=True, engine=engine, page_size=page_size)
+        rows = self.conn.execute('''
+            SELECT ticket, account_number, account_name, match_source, match_fingerprint
+            FROM snow ORDER BY ticket
+        ''').fetchall()
+        return matched, rows
+
+    def test_pandas_engine_matches_python_engine(self):
+        python_matched, python_rows = self.match('python')
+        pandas_matched, pandas_rows = self.match('pandas')
+
+        self.assertEqual(pandas_rows, python_rows)
+        self.assertEqual(pandas_matched, python_matched)
+        # Both sources are covered
+        sources = {row[3] for row in python_rows}
+        self.assertTrue({'description', 'text'} <= sources, sources)
+
+    def test_page_size_does_not_change_results(self):
+        _, rows = self.match('pandas')
+        _, small_page_rows = self.match('pandas', page_size=7)
+        self.assertEqual(small_page_rows, rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
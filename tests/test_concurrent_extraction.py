@@ -0,0 +1,143 @@
+"""extract_tickets_concurrently with several workers, a real BatchWriter and a temporary database"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import selenium_debug_session
+from account_index import get_account_index
+from create_database import create_database, get_sap_generation
+from db_connection import close_connection, get_connection
+from db_writer import BatchWriter
+from selenium_debug_session import driver_pool_extractor, extract_tickets_concurrently
+from work_queue import ExtractionQueue, DONE, PENDING
+
+TICKETS = [f"RITM{number:04d}" for number in range(40)]
+
+# Extraction result per ticket: account in SAP, valid-range account not in SAP, no account, no email
+def email_text(ticket):
+    number = int(ticket[4:])
+    if number % 4 == 0:
+        return f"Zahlung fuer Kunde 21000001 ({ticket})"
+    if number % 4 == 1:
+        return "Bitte Konto 20-572883 ausgleichen"
+    if number % 4 == 2:
+        return "Danke fuer die Zahlung"
+    return ""
+
+# Tickets whose extraction raises (released back to the queue)
+FAILING = {'RITM0007', 'RITM0021'}
+
+
+class ConcurrentExtractionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'test.db')
+        conn = create_database(self.db_path)
+        conn.executemany("INSERT INTO snow (ticket, short_description) VALUES (?, 'Zahlungsavis')",
+                         [(ticket,) for ticket in TICKETS])
+        conn.execute('''
+            INSERT INTO sap (document_number, reference, company_code_currency_value,
+                             company_code_currency_key, name, customer)
+            VALUES ('1400000001', '9000000001', 10.0, 'EUR', 'ACME GMBH', '21000001')
+        ''')
+        conn.commit()
+        self.account_index = get_account_index(conn, get_sap_generation(conn))
+        self.claims = ExtractionQueue(self.db_path)
+
+        self.calls = []
+        self.calls_lock = threading.Lock()
+
+    def tearDown(self):
+        close_connection(self.db_path)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def extract(self, ticket):
+        with self.calls_lock:
+            self.calls.append(ticket)
+        time.sleep(0.001 * (int(ticket[4:]) % 5))
+        if ticket in FAILING:
+            raise RuntimeError("page did not load")
+        return email_text(ticket)
+
+    def run_workers(self, extract, workers):
+        self.assertEqual(self.claims.enqueue_pending(), len(TICKETS))
+        tickets = self.claims.claim(len(TICKETS))
+        self.assertEqual(len(tickets), len(TICKETS))
+
+        with BatchWriter(self.db_path, batch_size=7) as writer:
+            failed = extract_tickets_concurrently(extract, tickets, self.account_index, workers,
+                                                  writer, self.claims)
+        # Per saved ticket its text, its account (if found) and the queue completion; per failed one the release
+        saved = [ticket for ticket in TICKETS if ticket not in FAILING]
+        with_account = [ticket for ticket in saved if int(ticket[4:]) % 4 in (0, 1)]
+        self.assertEqual(writer.written, 2 * len(saved) + len(with_account) + len(FAILING))
+        return failed
+
+    def check_results(self):
+        conn = get_connection(self.db_path)
+        rows = {row[0]: row[1:] for row in conn.execute(
+            "SELECT ticket, text, extraction_status, account_number, account_name, match_source FROM snow")}
+        queue = dict(conn.execute("SELECT ticket, status FROM extraction_queue"))
+
+        for ticket in TICKETS:
+            text, status, account_number, account_name, match_source = rows[ticket]
+            if ticket in FAILING:
+                self.assertEqual(rows[ticket], (None, None, None, None, None))
+                self.assertEqual(queue[ticket], PENDING)
+                continue
+
+            self.assertEqual(queue[ticket], DONE)
+            self.assertEqual(text, email_text(ticket))
+            self.assertEqual(status, 'extracted' if email_text(ticket) else 'nothing_to_extract')
+            number = int(ticket[4:])
+            if number % 4 == 0:
+                self.assertEqual((account_number, account_name, match_source), ('21000001', 'ACME GMBH', 'text'))
+            elif number % 4 == 1:
+                self.assertEqual((account_number, match_source), ('20572883', 'text'))
+            else:
+                self.assertEqual((account_number, match_source), (None, None))
+
+    def test_each_ticket_extracted_and_written_once(self):
+        failed = self.run_workers(self.extract, workers=8)
+
+        self.assertEqual(sorted(self.calls), sorted(TICKETS))
+        self.assertEqual(set(failed), FAILING)
+        self.check_results()
+
+    def test_driver_pool_uses_each_driver_by_one_worker_at_a_time(self):
+        drivers = [object() for _ in range(4)]
+        busy = set()
+        used = set()
+        lock = threading.Lock()
+
+        def extract_ticket(driver, ticket, base_url):
+            with lock:
+                self.assertNotIn(driver, busy)
+                busy.add(driver)
+                used.add(driver)
+            try:
+                return self.extract(ticket)
+            finally:
+                with lock:
+                    busy.discard(driver)
+
+        original = selenium_debug_session.extract_ticket
+        selenium_debug_session.extract_ticket = extract_ticket
+        try:
+            extract = driver_pool_extractor(drivers, 'http://127.0.0.1')
+            failed = self.run_workers(extract, workers=len(drivers))
+        finally:
+            selenium_debug_session.extract_ticket = original
+
+        self.assertEqual(sorted(self.calls), sorted(TICKETS))
+        self.assertEqual(set(failed), FAILING)
+        self.assertEqual(used, set(drivers))
+        self.check_results()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""click_first_created_link waits for the email list's rows, not just the table element"""
+import time
+import unittest
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+
+import selenium_debug_session
+from selenium_debug_session import EMAIL_ROWS_SELECTOR, EMAIL_TABLE_ID, NO_RECORDS_ROW_CLASS, click_first_created_link
+
+
+class FakeElement:
+    def __init__(self, attributes=None, children=None):
+        self.attributes = attributes or {}
+        self.children = children or {}
+
+    def get_attribute(self, name):
+        return self.attributes.get(name)
+
+    def find_element(self, by, value):
+        return self.children[value][0]
+
+    def find_elements(self, by, value):
+        return self.children.get(value, [])
+
+
+def email_row(href):
+    link = FakeElement({'textContent': '2025-09-28 09:25:16', 'href': href})
+    cells = [FakeElement(), FakeElement(children={'a': [link]})]
+    return FakeElement({'class': 'list_row'}, {'td': cells})
+
+
+class FakeDriver:
+    """The table element is there at once, its rows only after rows_delay seconds"""
+
+    def __init__(self, rows, rows_delay):
+        headers = [FakeElement({'textContent': 'Subject'}), FakeElement({'textContent': ' Created '})]
+        header_row = FakeElement(children={'th': headers})
+        self.table = FakeElement(children={'thead': [FakeElement(children={'tr': [header_row]})]})
+        self.rows = rows
+        self.rows_at = time.monotonic() + rows_delay
+        self.opened = []
+
+    def find_element(self, by, value):
+        assert (by, value) == (By.ID, EMAIL_TABLE_ID)
+        return self.table
+
+    def find_elements(self, by, value):
+        assert (by, value) == (By.CSS_SELECTOR, EMAIL_ROWS_SELECTOR)
+        return self.rows if time.monotonic() >= self.rows_at else []
+
+    def get(self, url):
+        self.opened.append(url)
+
+
+class EmailTableWaitTest(unittest.TestCase):
+
+    def test_waits_for_rows_filled_in_after_the_table(self):
+        driver = FakeDriver([email_row('https://snow/email1'), email_row('https://snow/email2')], rows_delay=0.5)
+        self.assertTrue(click_first_created_link(driver))
+        self.assertEqual(driver.opened, ['https://snow/email1'])
+
+    def test_empty_list(self):
+        no_records = FakeElement({'class': f'list2_row {NO_RECORDS_ROW_CLASS}'}, {'td': [FakeElement()]})
+        driver = FakeDriver([no_records], rows_delay=0.2)
+        self.assertFalse(click_first_created_link(driver))
+        self.assertEqual(driver.opened, [])
+
+    def test_rows_never_load_raises(self):
+        timeouts = dict(selenium_debug_session.WAIT_TIMEOUTS)
+        selenium_debug_session.WAIT_TIMEOUTS['email_table'] = 0.3
+        try:
+            driver = FakeDriver([email_row('https://snow/email1')], rows_delay=60)
+            with self.assertRaises(TimeoutException):
+                click_first_created_link(driver)
+        finally:
+            selenium_debug_session.WAIT_TIMEOUTS.update(timeouts)
+        self.assertEqual(driver.opened, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
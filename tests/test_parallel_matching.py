@@ -0,0 +1,59 @@
+"""process_all_tickets with worker processes against the serial run on the same database"""
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from create_database import create_database, load_sap_data, load_snow_data, process_all_tickets
+from db_connection import close_connection
+from generate_test_data import generate_test_data
+
+SNOW_COLUMNS = 'ticket, account_number, account_name, match_source, match_fingerprint'
+
+
+class ParallelMatchingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'test.db')
+        sap_file, snow_file = generate_test_data(self.temp_dir, sap_rows=2000, tickets=3000, seed=2)
+        self.conn = create_database(self.db_path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            load_sap_data(self.conn, sap_file)
+            load_snow_data(self.conn, snow_file)
+
+        # Email text for every third ticket, so text matches go through the workers too
+        tickets = [row[0] for row in self.conn.execute("SELECT ticket FROM snow ORDER BY ticket")]
+        descriptions = [row[0] for row in self.conn.execute("SELECT short_description FROM snow ORDER BY ticket DESC")]
+        self.conn.executemany("UPDATE snow SET text = ? WHERE ticket = ?",
+                              [(f"Guten Tag,\n{description}", ticket)
+                               for ticket, description in list(zip(tickets, descriptions))[::3]])
+        self.conn.commit()
+
+    def tearDown(self):
+        close_connection(self.db_path)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def match(self, **options):
+        # Small pages so the workers get many pages, returned out of order
+        with contextlib.redirect_stdout(io.StringIO()):
+            matched = process_all_tickets(self.conn, force_full=True, page_size=250, **options)
+        return matched, self.conn.execute(f"SELECT {SNOW_COLUMNS} FROM snow ORDER BY ticket").fetchall()
+
+    def test_parallel_matches_serial(self):
+        serial_matched, serial_rows = self.match(parallel=False)
+        # Start from unmatched tickets, so every row must be written by the parallel run
+        self.conn.execute("UPDATE snow SET account_number = NULL, account_name = NULL, "
+                          "match_source = NULL, match_fingerprint = NULL")
+        self.conn.commit()
+        parallel_matched, parallel_rows = self.match(parallel=True, workers=2)
+
+        self.assertEqual(parallel_rows, serial_rows)
+        self.assertEqual(parallel_matched, serial_matched)
+        self.assertTrue({'description', 'text'} <= {row[3] for row in serial_rows})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""load_sap_data with amounts that are not numbers, for both readers"""
+import contextlib
+import importlib.util
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from create_database import create_database, load_sap_data
+from db_connection import close_connection
+
+HAS_PANDAS = importlib.util.find_spec('pandas') is not None
+
+SAP_CSV = '''Document Number,Reference,Company Code Currency Value,Company Code Currency Key,Name,Customer
+1400000001,9000000001,10.50,EUR,ACME GMBH,21000001
+1400000002,9000000002,1.2.3,EUR,ACME GMBH,21000001
+1400000003,9000000003,n/a,EUR,BETA AG,00012345
+1400000004,9000000004,12 EUR,EUR,BETA AG,00012345
+1400000005,9000000005,abc,EUR,,
+'''
+
+
+class SapAmountTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'test.db')
+        self.sap_file = os.path.join(self.temp_dir, 'sap.csv')
+        with open(self.sap_file, 'w', encoding='utf-8') as f:
+            f.write(SAP_CSV)
+        self.conn = create_database(self.db_path)
+
+    def tearDown(self):
+        close_connection(self.db_path)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def load(self, reader):
+        messages = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            load_sap_data(self.conn, self.sap_file, progress_callback=messages.append, reader=reader)
+        amounts = self.conn.execute(
+            "SELECT document_number, company_code_currency_value FROM sap ORDER BY document_number").fetchall()
+        return amounts, messages
+
+    def assert_invalid_amounts_reported(self, reader):
+        amounts, messages = self.load(reader)
+
+        # Empty or n/a amounts and rows without a customer are not counted
+        self.assertEqual(amounts, [('1400000001', 10.5), ('1400000002', None),
+                                   ('1400000003', None), ('1400000004', None)])
+        warnings = [message for message in messages if message.startswith('Warning:')]
+        self.assertEqual(len(warnings), 1, messages)
+        self.assertIn('2 SAP amounts are not numbers', warnings[0])
+        self.assertIn("'12 EUR'", warnings[0])
+
+    def test_csv_reader(self):
+        self.assert_invalid_amounts_reported('csv')
+
+    @unittest.skipUnless(HAS_PANDAS, "reader='pandas' needs pandas")
+    def test_pandas_reader(self):
+        self.assert_invalid_amounts_reported('pandas')
+
+
+if __name__ == '__main__':
+    unittest.main()
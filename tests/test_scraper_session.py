@@ -0,0 +1,98 @@
+"""manual_debug_session cleanup and --watch behaviour with a fake browser"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from selenium.common.exceptions import TimeoutException
+
+import selenium_debug_session
+from db_connection import DB_PATH_ENV, close_connection
+from selenium_debug_session import manual_debug_session
+
+
+class FakeDriver:
+    def __init__(self):
+        self.quit_called = False
+
+    def quit(self):
+        self.quit_called = True
+
+
+class ScraperSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'test.db')
+        self.previous_db = os.environ.get(DB_PATH_ENV)
+        os.environ[DB_PATH_ENV] = self.db_path
+
+        self.profile_dir = os.path.join(self.temp_dir, 'chrome_profile')
+        os.makedirs(self.profile_dir)
+        self.drivers = []
+        self.profiles = []
+        self.logins = []
+        self.login_results = []
+        self.batches = 0
+
+        self.originals = {name: getattr(selenium_debug_session, name)
+                          for name in ('profile_in_use', 'setup_driver', 'login')}
+        self.original_run_batch = selenium_debug_session.ScraperSession.run_batch
+        selenium_debug_session.profile_in_use = lambda profile_dir: True
+        selenium_debug_session.setup_driver = self.setup_driver
+        selenium_debug_session.login = self.login
+
+    def tearDown(self):
+        for name, function in self.originals.items():
+            setattr(selenium_debug_session, name, function)
+        selenium_debug_session.ScraperSession.run_batch = self.original_run_batch
+        close_connection(self.db_path)
+        if self.previous_db is None:
+            os.environ.pop(DB_PATH_ENV, None)
+        else:
+            os.environ[DB_PATH_ENV] = self.previous_db
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def setup_driver(self, profile_dir=None):
+        self.profiles.append(profile_dir)
+        self.drivers.append(FakeDriver())
+        return self.drivers[-1]
+
+    def login(self, driver, base_url, cookie_file=None, timeout=None):
+        self.logins.append(driver)
+        result = self.login_results.pop(0) if self.login_results else None
+        if isinstance(result, Exception):
+            raise result
+
+    def failing_batch(self, session):
+        self.batches += 1
+        session.batch_failed = True
+        return 10
+
+    def test_temporary_profile_removed_when_login_fails(self):
+        self.login_results = [TimeoutException("Not logged in")]
+
+        with self.assertRaises(TimeoutException):
+            manual_debug_session(profile_dir=self.profile_dir)
+
+        temporary_profile = self.profiles[0]
+        self.assertNotEqual(temporary_profile, self.profile_dir)
+        self.assertFalse(os.path.exists(temporary_profile))
+        self.assertTrue(self.drivers[0].quit_called)
+        self.assertTrue(os.path.exists(self.profile_dir))
+
+    def test_watch_stops_when_expired_session_is_not_renewed(self):
+        # Login at start succeeds, the check after the failed batch times out
+        self.login_results = [None, TimeoutException("Not logged in")]
+        selenium_debug_session.ScraperSession.run_batch = lambda session: self.failing_batch(session)
+
+        manual_debug_session(profile_dir=self.profile_dir, watch=True)
+
+        self.assertEqual(self.batches, 1)
+        self.assertEqual(len(self.logins), 2)
+        self.assertTrue(self.drivers[0].quit_called)
+        self.assertFalse(os.path.exists(self.profiles[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+"""TableApiClient against a local stub of the ServiceNow Table API"""
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from servicenow_api import TableApiClient, TableApiError
+
+SESSION_COOKIE = {'name': 'glide_session', 'value': 'abc'}
+
+# sc_req_item sys_ids by number, and the u_email_client messages by request item sys_id
+REQUEST_ITEMS = {'RITM0001': 'item1', 'RITM0002': 'item2'}
+EMAILS = {'item1': ['Please check customer 20572883', 'Second email']}
+
+
+class TableApiStub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.requests.append((url.path, params, dict(self.headers)))
+
+        if 'glide_session=abc' not in self.headers.get('Cookie', ''):
+            self.send_response(302)
+            self.send_header('Location', '/login.do')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        query = params['sysparm_query']
+        if url.path == '/api/now/table/sc_req_item':
+            number = query.split('=', 1)[1]
+            result = [{'sys_id': REQUEST_ITEMS[number]}] if number in REQUEST_ITEMS else []
+        elif url.path == '/api/now/table/u_email_client':
+            sys_id = query.split('^')[0].split('=', 1)[1]
+            result = [{'u_message': message} for message in EMAILS.get(sys_id, [])]
+            result = result[:int(params.get('sysparm_limit', len(result)))]
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = json.dumps({'result': result}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TableApiClientTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), TableApiStub)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        TableApiStub.requests.clear()
+        self.client = TableApiClient(self.base_url, [SESSION_COOKIE], user_token='tok')
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_get_email_text(self):
+        self.assertEqual(self.client.get_email_text('RITM0001'), 'Please check customer 20572883')
+
+        (item_path, item_params, headers), (email_path, email_params, _) = TableApiStub.requests
+        self.assertEqual(item_path, '/api/now/table/sc_req_item')
+        self.assertEqual(item_params['sysparm_query'], 'number=RITM0001')
+        self.assertEqual(email_path, '/api/now/table/u_email_client')
+        self.assertEqual(email_params['sysparm_query'], 'u_item=item1^ORDERBYsys_created_on')
+        self.assertEqual(email_params['sysparm_limit'], '1')
+        self.assertEqual(headers['X-UserToken'], 'tok')
+
+    def test_ticket_without_emails(self):
+        self.assertEqual(self.client.get_email_text('RITM0002'), '')
+
+    def test_unknown_ticket(self):
+        self.assertEqual(self.client.get_email_text('RITM9999'), '')
+        self.assertEqual(len(TableApiStub.requests), 1)
+
+    def test_expired_session_raises(self):
+        client = TableApiClient(self.base_url, [{'name': 'glide_session', 'value': 'expired'}])
+        try:
+            with self.assertRaisesRegex(TableApiError, 'session expired'):
+                client.get_email_text('RITM0001')
+        finally:
+            client.close()
+
+    def test_get_records_empty_result(self):
+        self.assertEqual(self.client.get_records('sc_req_item', 'number=RITM9999', ['sys_id']), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+"""update_database run twice with the same files: the second run reloads and re-matches nothing"""
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from create_database import update_database
+from db_connection import close_connection
+from generate_test_data import generate_test_data
+
+
+class UnchangedUpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'test.db')
+        self.sap_file, self.snow_file = generate_test_data(self.temp_dir, sap_rows=500, tickets=200, seed=3)
+
+    def tearDown(self):
+        close_connection(self.db_path)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def update(self):
+        messages = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            matched = update_database(self.sap_file, self.snow_file, progress_callback=messages.append,
+                                      db_path=self.db_path)
+        return matched, messages
+
+    def test_unchanged_files_report_the_matched_tickets(self):
+        first_matched, _ = self.update()
+        second_matched, messages = self.update()
+
+        self.assertGreater(first_matched, 0)
+        self.assertEqual(second_matched, first_matched)
+        self.assertIn(f"SAP data unchanged, skipping reload of {self.sap_file}", messages)
+        self.assertEqual(messages[-1], f"Complete! No new matches, {first_matched} tickets matched")
+
+
+if __name__ == '__main__':
+    unittest.main()
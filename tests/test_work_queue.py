@@ -0,0 +1,63 @@
+"""ExtractionQueue against a temporary database: tickets that stop needing extraction after they were enqueued"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from create_database import create_database
+from db_connection import close_connection, get_connection
+from work_queue import ExtractionQueue, DONE, PENDING
+
+TICKETS = ['RITM0001', 'RITM0002', 'RITM0003', 'RITM0004']
+
+
+class StaleQueueEntryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'test.db')
+        conn = create_database(self.db_path)
+        conn.executemany("INSERT INTO snow (ticket, short_description) VALUES (?, 'Zahlungsavis')",
+                         [(ticket,) for ticket in TICKETS])
+        conn.commit()
+        self.claims = ExtractionQueue(self.db_path)
+        self.assertEqual(self.claims.enqueue_pending(), len(TICKETS))
+
+        # After enqueueing: one ticket matched by its description, one extracted by another run
+        conn.execute("UPDATE snow SET account_number = '21000001', account_name = 'ACME GMBH', "
+                     "match_source = 'description' WHERE ticket = 'RITM0001'")
+        conn.execute("UPDATE snow SET text = 'Danke', extraction_status = 'extracted' WHERE ticket = 'RITM0002'")
+        conn.commit()
+
+    def tearDown(self):
+        close_connection(self.db_path)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def queue_states(self):
+        return dict(get_connection(self.db_path).execute("SELECT ticket, status FROM extraction_queue"))
+
+    def test_claim_skips_tickets_that_no_longer_need_extraction(self):
+        claimed = [row[0] for row in self.claims.claim(len(TICKETS))]
+
+        self.assertEqual(claimed, ['RITM0003', 'RITM0004'])
+        self.assertEqual(self.claims.claim(len(TICKETS)), [])
+        account = get_connection(self.db_path).execute(
+            "SELECT account_number, match_source FROM snow WHERE ticket = 'RITM0001'").fetchone()
+        self.assertEqual(account, ('21000001', 'description'))
+
+    def test_enqueue_pending_marks_stale_entries_done(self):
+        self.assertEqual(self.claims.enqueue_pending(), 2)
+
+        states = self.queue_states()
+        self.assertEqual(states, {'RITM0001': DONE, 'RITM0002': DONE, 'RITM0003': PENDING, 'RITM0004': PENDING})
+
+        # A ticket that needs extraction again is handed out again
+        conn = get_connection(self.db_path)
+        conn.execute("UPDATE snow SET text = NULL, extraction_status = NULL WHERE ticket = 'RITM0002'")
+        conn.commit()
+        self.assertEqual(self.claims.enqueue_pending(), 3)
+        self.assertEqual([row[0] for row in self.claims.claim(len(TICKETS))], ['RITM0002', 'RITM0003', 'RITM0004'])
+
+
+if __name__ == '__main__':
+    unittest.main()
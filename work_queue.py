@@ -0,0 +1,190 @@
+"""
+Lease-based work queue for the email extraction.
+
+Pending tickets are copied into the extraction_queue table and claimed in small batches.
+A claim is a lease: the claiming process owns the tickets until the lease expires, after
+which any process can claim them again, so a killed run resumes where it stopped and any
+number of scraper processes split the backlog without doing a ticket twice.
+"""
+import json
+import os
+import socket
+import time
+import uuid
+
+from db_connection import get_connection
+
+# Tickets claimed per batch
+CLAIM_BATCH_SIZE = 10
+
+# Seconds a claim is valid; tickets still claimed after that are handed out again
+LEASE_SECONDS = 600
+
+# Claims per ticket before it is no longer handed out (a ticket that keeps failing);
+# enqueue_pending gives such tickets a new set of attempts
+MAX_ATTEMPTS = 3
+
+# Queue entry states
+PENDING = 'pending'
+CLAIMED = 'claimed'
+DONE = 'done'
+
+# Tickets that still need extraction: no account and no extraction status yet
+PENDING_EXTRACTION_CONDITION = '''
+    (account_number IS NULL OR account_number = '')
+    AND (extraction_status IS NULL OR extraction_status = '')
+'''
+
+COMPLETE_SQL = f'''
+    UPDATE extraction_queue
+    SET status = '{DONE}', completed_at = ?, lease_expires = NULL
+    WHERE ticket = ? AND worker = ?
+'''
+
+RELEASE_SQL = f'''
+    UPDATE extraction_queue
+    SET status = '{PENDING}', worker = NULL, lease_expires = NULL
+    WHERE ticket = ? AND worker = ?
+'''
+
+
+def create_work_queue(conn):
+    """Create the extraction_queue table if it does not exist"""
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS extraction_queue (
+            ticket TEXT PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT '{PENDING}',
+            worker TEXT,
+            lease_expires REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            enqueued_at REAL,
+            completed_at REAL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_extraction_queue_status ON extraction_queue (status, lease_expires)')
+    conn.commit()
+
+
+def new_worker_id():
+    """Identify this scraper process in claims (host, process id and a random suffix)"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class ExtractionQueue:
+    """One scraper process's view of the extraction queue"""
+
+    def __init__(self, db_path=None, worker_id=None, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.worker_id = worker_id or new_worker_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        create_work_queue(get_connection(db_path))
+
+    def enqueue_pending(self):
+        """
+        Add the tickets that still need extraction. Tickets done earlier that need it again
+        are reset, and tickets that ran out of attempts (e.g. during a network outage or
+        with an expired session) get new ones. Waiting tickets that no longer need extraction
+        (matched or extracted since they were added) are marked done.
+        Returns the number of tickets available to claim.
+        """
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        now = time.time()
+
+        cursor.execute(f'''
+            INSERT INTO extraction_queue (ticket, status, enqueued_at, attempts)
+            SELECT ticket, '{PENDING}', ?, 0 FROM snow
+            WHERE {PENDING_EXTRACTION_CONDITION}
+            ON CONFLICT(ticket) DO UPDATE SET status = '{PENDING}', worker = NULL, lease_expires = NULL,
+                                              attempts = 0, enqueued_at = excluded.enqueued_at
+            WHERE extraction_queue.status = '{DONE}'
+        ''', (now,))
+        cursor.execute(f'''
+            UPDATE extraction_queue
+            SET status = '{PENDING}', worker = NULL, lease_expires = NULL, attempts = 0
+            WHERE attempts >= ? AND (status = '{PENDING}' OR (status = '{CLAIMED}' AND lease_expires < ?))
+        ''', (self.max_attempts, now))
+        cursor.execute(f'''
+            UPDATE extraction_queue
+            SET status = '{DONE}', worker = NULL, lease_expires = NULL, completed_at = ?
+            WHERE (status = '{PENDING}' OR (status = '{CLAIMED}' AND lease_expires < ?))
+            AND ticket NOT IN (SELECT ticket FROM snow WHERE {PENDING_EXTRACTION_CONDITION})
+        ''', (now, now))
+        conn.commit()
+
+        cursor.execute(f'''
+            SELECT COUNT(*) FROM extraction_queue
+            WHERE (status = '{PENDING}' OR (status = '{CLAIMED}' AND lease_expires < ?)) AND attempts < ?
+        ''', (now, self.max_attempts))
+        return cursor.fetchone()[0]
+
+    def claim(self, batch_size=CLAIM_BATCH_SIZE, exclude=()):
+        """
+        Claim up to batch_size pending tickets (or tickets whose lease expired) for this worker,
+        except the tickets in exclude (e.g. the ones that already failed in this run) and
+        tickets that no longer need extraction (matched or extracted since they were added).
+        Returns (ticket, short_description, eml_domain) rows, empty when the queue is drained.
+        """
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        now = time.time()
+
+        conn.commit()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute(f'''
+                UPDATE extraction_queue
+                SET status = '{CLAIMED}', worker = ?, lease_expires = ?, attempts = attempts + 1
+                WHERE ticket IN (
+                    SELECT q.ticket FROM extraction_queue q
+                    JOIN snow ON snow.ticket = q.ticket
+                    WHERE (q.status = '{PENDING}' OR (q.status = '{CLAIMED}' AND q.lease_expires < ?))
+                    AND q.attempts < ?
+                    AND q.ticket NOT IN (SELECT value FROM json_each(?))
+                    AND {PENDING_EXTRACTION_CONDITION}
+                    ORDER BY q.ticket
+                    LIMIT ?
+                )
+                RETURNING ticket
+            ''', (self.worker_id, now + self.lease_seconds, now, self.max_attempts,
+                  json.dumps(list(exclude)), int(batch_size)))
+            tickets = [row[0] for row in cursor.fetchall()]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        if not tickets:
+            return []
+
+        placeholders = ','.join('?' * len(tickets))
+        cursor.execute(f'''
+            SELECT ticket, short_description, eml_domain FROM snow
+            WHERE ticket IN ({placeholders})
+            ORDER BY ticket
+        ''', tickets)
+        return cursor.fetchall()
+
+    def complete(self, ticket_number, writer=None):
+        """Mark a claimed ticket done (through writer, if given, in the batch of its results)"""
+        self._write(COMPLETE_SQL, (time.time(), ticket_number, self.worker_id), writer)
+
+    def release(self, ticket_number, writer=None):
+        """Hand a claimed ticket back to the queue, e.g. after an error"""
+        self._write(RELEASE_SQL, (ticket_number, self.worker_id), writer)
+
+    def _write(self, sql, params, writer):
+        if writer is not None:
+            writer.write(sql, params)
+        else:
+            conn = get_connection(self.db_path)
+            conn.execute(sql, params)
+            conn.commit()
+
+    def counts(self):
+        """Number of queue entries per status"""
+        cursor = get_connection(self.db_path).cursor()
+        cursor.execute("SELECT status, COUNT(*) FROM extraction_queue GROUP BY status")
+        return dict(cursor.fetchall())